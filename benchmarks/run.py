@@ -0,0 +1,368 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# the GA modules in src/ are imported as top level modules, the dql package from the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pymunk as pm
+
+from character_simulation import GROUND_POSITION, GROUND_POLY
+
+time_step = 1.0 / 60.0
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+# Every scenario is a setup function returning (run, operations, unit): run() does `operations` operations
+# and is timed repeat times. The result is the median rate in operations per second, higher is better
+
+def sim_step():
+    from character_simulation import CharacterSimulation
+
+    sim = CharacterSimulation(GROUND_POSITION, GROUND_POLY, np.random.default_rng(0))
+
+    def run():
+        sim.reset()
+        for _ in range(600):
+            sim.step(time_step)
+
+    return run, 600, "steps/s"
+
+
+def population_step():
+    from character_simulation import CharacterSimulation, step_population
+    from neural_network import PopulationNetwork
+
+    rng = np.random.default_rng(0)
+    sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng) for _ in range(100)]
+    network = PopulationNetwork([sim.neural_network for sim in sim_list])
+
+    def run():
+        for sim in sim_list:
+            sim.reset()
+        for _ in range(60):
+            step_population(sim_list, network, time_step)
+
+    # one operation is one tick of the whole population
+    return run, 60, "population ticks/s"
+
+
+def feedforward():
+    from neural_network import NeuralNetwork
+
+    network = NeuralNetwork(rng=np.random.default_rng(0))
+    inputs = np.random.default_rng(1).standard_normal(24)
+
+    def run():
+        for _ in range(2000):
+            network.feedforward(inputs)
+
+    return run, 2000, "calls/s"
+
+
+def population_feedforward():
+    from neural_network import NeuralNetwork, PopulationNetwork
+
+    rng = np.random.default_rng(0)
+    network = PopulationNetwork([NeuralNetwork(rng=rng) for _ in range(100)])
+    inputs = rng.standard_normal((100, 24))
+
+    def run():
+        for _ in range(2000):
+            network.feedforward(inputs)
+
+    return run, 2000, "calls/s (100 networks)"
+
+
+def population_feedforward_auto():
+    from inference import make_engine
+    from neural_network import NeuralNetwork
+
+    rng = np.random.default_rng(0)
+    network = make_engine([NeuralNetwork(rng=rng) for _ in range(100)], "auto")
+    inputs = rng.standard_normal((100, 24))
+
+    def run():
+        for _ in range(2000):
+            network.feedforward(inputs)
+
+    return run, 2000, "calls/s (100 networks, fastest float32 engine)"
+
+
+def _ranked_population():
+    from character_simulation import CharacterSimulation
+
+    rng = np.random.default_rng(0)
+    sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng) for _ in range(100)]
+    for sim in sim_list:
+        sim.fitness = rng.random()
+    return sorted(sim_list, key=lambda x: x.fitness)[50:]
+
+
+def make_next_gen():
+    from next_gen import make_next_gen
+
+    parents = _ranked_population()
+    rng = random.Random(0)
+
+    def run():
+        make_next_gen(parents, rng)
+
+    return run, 1, "generations/s"
+
+
+def make_next_gen_batched():
+    from next_gen import make_next_gen_batched
+
+    parents = _ranked_population()
+    rng = np.random.default_rng(0)
+    # reuse the same sims every run, like headless.py does
+    sim_pool = make_next_gen_batched(parents, rng)
+
+    def run():
+        make_next_gen_batched(parents, rng, sim_pool=sim_pool)
+
+    return run, 1, "generations/s"
+
+
+def _generation_files():
+    from character_simulation import CharacterSimulation
+
+    rng = np.random.default_rng(0)
+    sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng) for _ in range(100)]
+    directory = tempfile.mkdtemp(prefix="qwop-bench-")
+    atexit.register(shutil.rmtree, directory, True)
+    return sim_list, directory
+
+
+def save_json():
+    import main
+
+    sim_list, directory = _generation_files()
+
+    def run():
+        # output_data writes to out/<run>/ in the working directory
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            main.output_data(1, sim_list, "json")
+        finally:
+            os.chdir(cwd)
+
+    return run, 1, "generations/s"
+
+
+def load_json():
+    import main
+
+    sim_list, directory = _generation_files()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        main.output_data(1, sim_list, "json")
+    finally:
+        os.chdir(cwd)
+    path = os.path.join(directory, "out", str(main.dir_count), "1.json")
+
+    def run():
+        with open(path) as file:
+            data = json.load(file)
+        for sim, sim_data in zip(sim_list, data):
+            sim.load_data(sim_data)
+
+    return run, 1, "generations/s"
+
+
+def save_checkpoint():
+    from checkpoint import save_checkpoint
+
+    sim_list, directory = _generation_files()
+    path = os.path.join(directory, "1.ckpt")
+
+    def run():
+        save_checkpoint(path, sim_list)
+
+    return run, 1, "generations/s"
+
+
+def load_checkpoint():
+    from checkpoint import save_checkpoint, read_checkpoint, load_population
+
+    sim_list, directory = _generation_files()
+    path = os.path.join(directory, "1.ckpt")
+    save_checkpoint(path, sim_list)
+
+    # into the existing sims like load_json, building the sims would dominate the time
+    def run():
+        load_population(read_checkpoint(path), sim_list)
+
+    return run, 1, "generations/s"
+
+
+def custom_env_step():
+    from dql.gym_qwop.envs.custom_env import CustomEnv
+
+    env = CustomEnv()
+    actions = np.random.default_rng(0).integers(0, 9, 1000)
+
+    def run():
+        env.reset()
+        for action in actions:
+            if env.step(action)[2]:
+                env.reset()
+
+    return run, len(actions), "steps/s"
+
+
+def agent_learn():
+    from dql.agent import Agent
+
+    agent = Agent(gamma=0.99, epsilon=1.0, batch_size=64, num_actions=9, epsilon_end=0.01, input_dims=[31],
+                  learning_rate=0.001, epsilon_decrement=0.000001, max_mem_size=10_000)
+    rng = np.random.default_rng(0)
+    for _ in range(5000):
+        agent.store_transition(rng.standard_normal(31).astype(np.float32), int(rng.integers(0, 9)), rng.random(),
+                               rng.standard_normal(31).astype(np.float32), bool(rng.random() < 0.01))
+
+    def run():
+        for _ in range(50):
+            agent.learn()
+
+    return run, 50, "updates/s"
+
+
+SCENARIOS = {
+    "sim_step": sim_step,
+    "population_step": population_step,
+    "feedforward": feedforward,
+    "population_feedforward": population_feedforward,
+    "population_feedforward_auto": population_feedforward_auto,
+    "make_next_gen": make_next_gen,
+    "make_next_gen_batched": make_next_gen_batched,
+    "save_json": save_json,
+    "load_json": load_json,
+    "save_checkpoint": save_checkpoint,
+    "load_checkpoint": load_checkpoint,
+    "custom_env_step": custom_env_step,
+    "agent_learn": agent_learn,
+}
+
+
+def run_scenario(setup, repeat: int) -> dict:
+    # every scenario starts from the same global random state
+    random.seed(0)
+    np.random.seed(0)
+    run, operations, unit = setup()
+    # warm up (first call caches, lazy imports, allocator)
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "value": operations / median,
+        "unit": unit,
+        "seconds_per_op": median / operations,
+        "times": times,
+    }
+
+
+def machine_info() -> dict:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pymunk": pm.version,
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+
+# Returns the names of the scenarios that got slower than the baseline by more than tolerance
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    print()
+    print("scenario".ljust(26) + "baseline".rjust(14) + "current".rjust(14) + "change".rjust(10))
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["value"]
+        change = result["value"] / before - 1.0
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(name.ljust(26) + str(round(before, 1)).rjust(14) + str(round(result["value"], 1)).rjust(14) +
+              (("+" if change >= 0 else "") + str(round(change * 100, 1)) + "%").rjust(10) + flag)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation, network, breeding, IO and DQN hot paths")
+    parser.add_argument("scenarios", nargs="*", help="scenarios to run (default: all): " + ", ".join(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per scenario, the median is reported")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"),
+                        help="where to write the JSON results")
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "baseline.json"),
+                        help="results to compare against, if the file exists")
+    parser.add_argument("--save-baseline", action="store_true", help="also store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown against the baseline that counts as a regression (0.1 is 10%%)")
+    args = parser.parse_args()
+
+    names = args.scenarios if args.scenarios else list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario " + name)
+
+    results = {}
+    for name in names:
+        try:
+            results[name] = run_scenario(SCENARIOS[name], args.repeat)
+        except ImportError as error:
+            # e.g. torch or gym not installed, the GA scenarios still run
+            print(name.ljust(26) + "skipped (" + str(error) + ")")
+            continue
+        print(name.ljust(26) + str(round(results[name]["value"], 1)).rjust(14) + " " + results[name]["unit"])
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "machine": machine_info(), "results": results}
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline["machine"] != report["machine"]:
+            print("warning: the baseline was recorded on a different machine or environment")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(str(len(regressions)) + " regression(s): " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+import argparse
+import queue
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as tmp
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+from dql.agent import Agent, DeepQNetwork
+from dql.shared_replay import SharedReplayBuffer
+
+INPUT_DIMS = [31]
+NUM_ACTIONS = 9
+LAYER_DIMS = 256, 256
+
+
+# Actor/learner split: actor processes play the game with their own copy of the Q network and stream
+# transitions to the learner, the learner trains on them and publishes new weights. Physics and backprop
+# run at the same time instead of taking turns.
+# The weights live in one flat shared memory tensor with a version counter. The transitions are sent in chunks
+# of torch tensors, which torch.multiprocessing passes through shared memory instead of pickling the data.
+# With --shared-replay or --replay-file the actors write straight into a SharedReplayBuffer (one segment each)
+# and the queue only carries the episode scores
+
+
+class SharedWeights:
+    # context is the multiprocessing context the actors are started with
+    def __init__(self, network: DeepQNetwork, context):
+        self.vector: torch.Tensor = parameters_to_vector(network.parameters()).detach().cpu().clone().share_memory_()
+        self.version = context.Value("l", 0)
+        self.lock = context.Lock()
+
+    def publish(self, network: DeepQNetwork) -> None:
+        with self.lock:
+            self.vector.copy_(parameters_to_vector(network.parameters()).detach())
+            self.version.value += 1
+
+    # Copy the weights into network if they are newer than version, returns the version the network now has
+    def pull(self, network: DeepQNetwork, version: int) -> int:
+        if self.version.value == version:
+            return version
+        with self.lock:
+            vector_to_parameters(self.vector.clone(), network.parameters())
+            return self.version.value
+
+
+def run_actor(index: int, epsilon: float, weights: SharedWeights, transitions, stop, chunk_size: int,
+              sync_interval: int, max_episode_steps: int, seed: int,
+              replay: tuple[str | None, str | None] | None = None) -> None:
+    # imported here so the learner process does not need a window or gym
+    from dql.gym_qwop.envs.custom_env import CustomEnv
+
+    # one thread per actor, the actors already fill the cores
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(seed)
+    network = DeepQNetwork(None, INPUT_DIMS, *LAYER_DIMS, NUM_ACTIONS)
+    network.requires_grad_(False)
+    version = weights.pull(network, -1)
+    # replay is the (path, name) of the shared store, this actor owns segment index of it
+    store = None
+    if replay is not None:
+        store = SharedReplayBuffer.attach(path=replay[0], name=replay[1])
+        writer = store.writer(index)
+
+    env = CustomEnv()
+    states = np.zeros((chunk_size, *INPUT_DIMS), dtype=np.float32)
+    new_states = np.zeros((chunk_size, *INPUT_DIMS), dtype=np.float32)
+    actions = np.zeros(chunk_size, dtype=np.int32)
+    rewards = np.zeros(chunk_size, dtype=np.float32)
+    dones = np.zeros(chunk_size, dtype=np.bool_)
+    episode_starts = np.zeros(chunk_size, dtype=np.bool_)
+    filled = 0
+
+    # the learner stops reading once it is done, so never block on a full queue without checking for stop
+    def send(message: tuple) -> None:
+        while not stop.is_set():
+            try:
+                transitions.put(message, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    observation = env.reset()[0]
+    episode_start = True
+    score = 0.0
+    episode_steps = 0
+    steps = 0
+    while not stop.is_set():
+        if rng.random() > epsilon:
+            with torch.no_grad():
+                action = int(torch.argmax(network.forward(torch.tensor(observation))).item())
+        else:
+            action = int(rng.integers(0, NUM_ACTIONS))
+
+        next_observation, reward, done, _, _ = env.step(action)
+        states[filled] = observation
+        new_states[filled] = next_observation
+        actions[filled] = action
+        rewards[filled] = reward
+        dones[filled] = done
+        episode_starts[filled] = episode_start
+        episode_start = False
+        filled += 1
+        score += reward
+        episode_steps += 1
+        steps += 1
+
+        if filled == chunk_size and store is not None:
+            writer.store_transitions(states, actions, rewards, new_states, dones)
+            filled = 0
+        elif filled == chunk_size:
+            send(("transitions", torch.from_numpy(states.copy()), torch.from_numpy(actions.copy()),
+                  torch.from_numpy(rewards.copy()), torch.from_numpy(new_states.copy()),
+                  torch.from_numpy(dones.copy()), torch.from_numpy(episode_starts.copy())))
+            filled = 0
+
+        if done or episode_steps >= max_episode_steps:
+            send(("episode", index, score, episode_steps))
+            observation = env.reset()[0]
+            episode_start = True
+            score = 0.0
+            episode_steps = 0
+        else:
+            observation = next_observation
+
+        if steps % sync_interval == 0:
+            version = weights.pull(network, version)
+
+    env.close()
+    if store is not None:
+        store.close()
+    # whatever is still buffered is dropped, the learner is not reading anymore
+    transitions.cancel_join_thread()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the DQN agent with parallel actors and one learner")
+    parser.add_argument("--actors", type=int, default=max(1, tmp.cpu_count() - 1))
+    parser.add_argument("--updates", type=int, default=100_000, help="gradient updates before stopping")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--learning-rate", type=float, default=0.0005)
+    parser.add_argument("--gamma", type=float, default=0.99)
+    parser.add_argument("--memory", type=int, default=1_000_000, help="replay memory size")
+    parser.add_argument("--warmup", type=int, default=10_000, help="transitions to collect before learning")
+    parser.add_argument("--publish-interval", type=int, default=100, help="updates between two weight publishes")
+    parser.add_argument("--target-update-interval", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=64, help="transitions per message from an actor")
+    parser.add_argument("--sync-interval", type=int, default=400, help="actor steps between two weight pulls")
+    parser.add_argument("--max-episode-steps", type=int, default=2000)
+    parser.add_argument("--epsilon", type=float, default=0.4,
+                        help="exploration of the first actor, actor i explores epsilon^(1 + 7i / (actors - 1))")
+    parser.add_argument("--prioritized", action="store_true")
+    parser.add_argument("--shared-replay", action="store_true",
+                        help="actors write transitions into a shared memory replay store instead of the queue")
+    parser.add_argument("--replay-file", type=str, default=None,
+                        help="like --shared-replay but in a memory mapped file, reused when the learner restarts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.prioritized and (args.shared_replay or args.replay_file is not None):
+        parser.error("the shared replay store samples uniformly, it can't be combined with --prioritized")
+
+    store = None
+    replay = None
+    if args.shared_replay or args.replay_file is not None:
+        # the actors write whole chunks, the guard band must cover one
+        store = SharedReplayBuffer.create(args.actors, args.memory // args.actors, INPUT_DIMS[0],
+                                          path=args.replay_file, guard=max(64, args.chunk_size),
+                                          rng=np.random.default_rng(args.seed))
+        replay = args.replay_file, store.name
+        if store.mem_cntr > 0:
+            print("resuming with " + str(len(store)) + " transitions from " + args.replay_file)
+
+    torch.manual_seed(args.seed)
+    agent = Agent(gamma=args.gamma, epsilon=0.0, learning_rate=args.learning_rate, input_dims=INPUT_DIMS,
+                  batch_size=args.batch_size, num_actions=NUM_ACTIONS, max_mem_size=args.memory,
+                  prioritized=args.prioritized, target_update_interval=args.target_update_interval, memory=store)
+    # spawn, not fork: forking a process that already started torch threads can deadlock the children
+    context = tmp.get_context("spawn")
+    weights = SharedWeights(agent.Q_eval, context)
+    transitions = context.Queue(maxsize=1024)
+    stop = context.Event()
+    # a spread of exploration rates like Ape-X, from epsilon down to epsilon^8
+    epsilons = [args.epsilon ** (1 + 7 * i / max(1, args.actors - 1)) for i in range(args.actors)]
+    actors = [context.Process(target=run_actor,
+                              args=(i, epsilons[i], weights, transitions, stop, args.chunk_size, args.sync_interval,
+                                    args.max_episode_steps, args.seed + 1 + i, replay), daemon=True)
+              for i in range(args.actors)]
+    for actor in actors:
+        actor.start()
+
+    scores: list[float] = []
+    received = 0
+    resumed = store.mem_cntr if store is not None else 0
+    start = time.perf_counter()
+    last_report = start
+    while agent.learn_step_counter < args.updates:
+        # take everything that is waiting, block only while there is nothing to learn from yet
+        block = len(agent.memory) < args.warmup
+        while True:
+            try:
+                message = transitions.get(timeout=1.0) if block else transitions.get_nowait()
+            except queue.Empty:
+                break
+            block = False
+            if message[0] == "transitions":
+                batch = [tensor.numpy() for tensor in message[1:]]
+                agent.memory.store_transitions(batch[0], batch[1], batch[2], batch[3], batch[4], batch[5])
+                received += len(batch[0])
+            else:
+                scores.append(message[2])
+        if store is not None:
+            received = store.mem_cntr - resumed
+
+        if len(agent.memory) < max(args.warmup, args.batch_size):
+            continue
+
+        agent.learn_batch()
+        if agent.learn_step_counter % args.publish_interval == 0:
+            weights.publish(agent.Q_eval)
+
+        now = time.perf_counter()
+        if now - last_report >= 10.0:
+            last_report = now
+            print("updates " + str(agent.learn_step_counter) + " transitions " + str(received) +
+                  " env steps/s %.0f" % (received / (now - start)) +
+                  " episodes " + str(len(scores)) +
+                  (" average score %.2f" % np.mean(scores[-100:]) if scores else ""))
+
+    stop.set()
+    for actor in actors:
+        actor.join()
+    torch.save(agent.Q_eval.state_dict(), "dqn_actor_learner.pt")
+    if store is not None:
+        store.close()
+        store.unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as functional
+import torch.optim as optim
+import numpy as np
+
+from dql.replay_buffer import ReplayBuffer, FrameReplayBuffer, PrioritizedReplayBuffer
+from dql.phase_timer import timer
+
+# The DQN agent without the environment, so processes that only learn (see actor_learner.py) don't import gym or
+# pyray, register the env or pick an output directory like main.py does
+
+
+class DeepQNetwork(nn.Module):
+    # fc - stands for fully connected layer
+    # learning_rate - None builds no optimizer, for networks that are only evaluated (target and actor networks)
+    def __init__(self, learning_rate: float | None, input_dims: list[int], fc1_dims: int, fc2_dims: int,
+                 n_actions: int):
+        super(DeepQNetwork, self).__init__()
+        self.input_dims: list[int] = input_dims
+        self.fc1_dims: int = fc1_dims
+        self.fc2_dims: int = fc2_dims
+        self.n_actions: int = n_actions
+        self.fc1 = nn.Linear(*self.input_dims, self.fc1_dims)
+        self.fc2 = nn.Linear(self.fc1_dims, self.fc2_dims)
+        self.fc3 = nn.Linear(self.fc2_dims, self.n_actions)
+        self.optimizer: optim.Optimizer | None = None
+        if learning_rate is not None:
+            self.optimizer = optim.Adam(self.parameters(), lr=learning_rate)
+        self.loss = nn.MSELoss()
+        self.device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
+        self.to(self.device)
+
+    def forward(self, state: torch.Tensor) -> torch.Tensor:
+        # passing the input to the first layer
+        x: torch.Tensor = functional.relu(self.fc1(state))
+        # passing the output from first layer to the second layer
+        x: torch.Tensor = functional.relu(self.fc2(x))
+
+        # passing the output from the second layer into the action layer
+        # Q values are plain regression outputs: a relu here could never go negative and a unit that ends up
+        # below zero for a state stops getting gradients, so its Q value stays stuck at 0
+        actions: torch.Tensor = self.fc3(x)
+
+        return actions
+
+
+class Agent:
+    # gamma - determines the weighting of future rewards
+    # epsilon - determines how often does the agent spend exploring its environment vs taking the best known action
+    # batch_size - learning from of batch of memory
+    def __init__(self, gamma: float, epsilon: float, learning_rate: float, input_dims: list[int], batch_size: int,
+                 num_actions: int, max_mem_size: int = 100_000, epsilon_end: float = 0.01,
+                 epsilon_decrement: float = 0.00001, prioritized: bool = False, target_update_interval: int = 1000,
+                 updates_per_step: int = 1, memory=None):
+        self.gamma: float = gamma
+        self.epsilon: float = epsilon
+        self.epsilon_min: float = epsilon_end
+        self.epsilon_dec: float = epsilon_decrement
+        self.learning_rate: float = learning_rate
+        # saves the actions that the agent can take
+        self.action_space: list[int] = [i for i in range(num_actions)]
+        self.mem_size: int = max_mem_size
+        self.batch_size: int = batch_size
+        self.prioritized: bool = prioritized
+
+        self.Q_eval = DeepQNetwork(self.learning_rate, n_actions=num_actions, input_dims=input_dims,
+                                   fc1_dims=256, fc2_dims=256)
+
+        # target_update_interval - gradient updates between two copies of Q_eval into Q_target (0 disables the
+        # target network and the targets come from Q_eval itself)
+        # updates_per_step - gradient updates every time learn() is called, i.e. per env step
+        self.target_update_interval: int = target_update_interval
+        self.updates_per_step: int = updates_per_step
+        self.learn_step_counter: int = 0
+        # Double DQN: Q_eval picks the best next action and the slowly updated Q_target evaluates it,
+        # which keeps the max over noisy estimates from inflating the targets
+        self.Q_target: DeepQNetwork | None = None
+        if target_update_interval > 0:
+            self.Q_target = DeepQNetwork(None, n_actions=num_actions, input_dims=input_dims,
+                                         fc1_dims=256, fc2_dims=256)
+            self.Q_target.load_state_dict(self.Q_eval.state_dict())
+            self.Q_target.requires_grad_(False)
+
+        # prioritized replay samples transitions with a large TD error more often, otherwise the memory stores
+        # every observation once (see replay_buffer.py)
+        # memory - a replay memory to learn from instead of allocating one, e.g. a SharedReplayBuffer the actors
+        # of actor_learner.py write into
+        if memory is not None:
+            self.memory = memory
+        elif prioritized:
+            self.memory: ReplayBuffer = PrioritizedReplayBuffer(self.mem_size, input_dims)
+        else:
+            self.memory: ReplayBuffer = FrameReplayBuffer(self.mem_size, input_dims)
+
+    # episode_start - state is the first observation of an episode (right after env.reset())
+    def store_transition(self, state: np.ndarray, action: int, reward, new_state: np.ndarray,
+                         done: bool, episode_start: bool = False) -> None:
+        self.memory.store_transition(state, action, reward, new_state, done, episode_start)
+
+    def choose_action(self, observation: np.ndarray) -> int:
+        # if random is greater, then take best known action
+        # if np.random.random() > self.epsilon:
+        if observation.ndim != 0 and np.random.random() > self.epsilon:
+            # the observation is already a float32 array. torch.tensor copies it: CustomEnv returns read-only views
+            # and torch.from_numpy does not support those
+            state: torch.Tensor = torch.tensor(observation).to(self.Q_eval.device)
+            with torch.no_grad():
+                actions: torch.Tensor = self.Q_eval.forward(state)
+            action: int = torch.argmax(actions).item()
+        # else take a random action from action space
+        else:
+            action: int = np.random.choice(self.action_space)
+
+        return action
+
+    def learn(self) -> None:
+        # here we can either choose if the agent will start learning when the whole memory is filled up
+        # or when a memory batch is filled up
+        # we choose the batch because it would more efficient
+
+        # if the batch is not filled up don't learn (len counts the transitions that can be sampled)
+        if len(self.memory) < self.batch_size:
+            return
+
+        for _ in range(self.updates_per_step):
+            self.learn_batch()
+
+        self.epsilon -= self.epsilon_dec
+        # self.epsilon = self.epsilon - self.epsilon_dec if self.epsilon > self.epsilon_min else self.epsilon_min
+
+    # One gradient update on a sampled batch
+    def learn_batch(self) -> None:
+        self.Q_eval.optimizer.zero_grad(set_to_none=True)
+
+        with timer.phase("learn_sample"):
+            batch, states, actions, rewards, new_states, terminals, weights = self.memory.sample(self.batch_size)
+
+        # converting a numpy array subset of out agent's memory into a pytorch sensor
+        # tensor is multidimensional array, which is a fundamental data structure used
+        # for building and training neural networks.
+        # the states and the new states go through Q_eval in one forward pass
+        state_batch: torch.Tensor = torch.from_numpy(np.concatenate((states, new_states))).to(self.Q_eval.device)
+
+        reward_batch: torch.Tensor = torch.from_numpy(rewards).to(self.Q_eval.device)
+
+        terminal_batch: torch.Tensor = torch.from_numpy(terminals).to(self.Q_eval.device)
+
+        action_batch: torch.Tensor = torch.from_numpy(actions).to(self.Q_eval.device).long()
+
+        # we want to be moving the agents estimate for the value of the current state
+        # towards the maximal value for the next state
+        # in simple words, nudging it towards selecting maximal actions
+
+        # the reason for gathering action_batch is that we want to get the values of the actions we took
+        # we can't update the values of the actions that we didn't take
+
+        with timer.phase("learn_forward"):
+            q_all: torch.Tensor = self.Q_eval.forward(state_batch)
+            q_eval: torch.Tensor = q_all[:self.batch_size].gather(1, action_batch.unsqueeze(1)).squeeze(1)
+
+            with torch.no_grad():
+                q_next_online: torch.Tensor = q_all[self.batch_size:]
+                if self.Q_target is not None:
+                    # Double DQN target: the action Q_eval likes best, valued by Q_target
+                    next_actions: torch.Tensor = torch.argmax(q_next_online, dim=1, keepdim=True)
+                    q_next: torch.Tensor = self.Q_target.forward(state_batch[self.batch_size:])
+                    q_next = q_next.gather(1, next_actions).squeeze(1)
+                else:
+                    q_next: torch.Tensor = torch.max(q_next_online, dim=1)[0]
+                # there is no next state after a terminal transition
+                q_next = q_next.masked_fill(terminal_batch, 0.0)
+                q_target: torch.Tensor = reward_batch + self.gamma * q_next
+
+            if self.prioritized:
+                # importance sampling weights correct for the non uniform sampling,
+                # the new TD errors become the priorities of the sampled transitions
+                td_error: torch.Tensor = q_target - q_eval
+                weight_batch: torch.Tensor = torch.from_numpy(weights).to(self.Q_eval.device)
+                loss: torch.Tensor = (weight_batch * td_error ** 2).mean()
+                self.memory.update_priorities(batch, td_error.detach().abs().cpu().numpy())
+            else:
+                loss: torch.Tensor = self.Q_eval.loss(q_target, q_eval).to(self.Q_eval.device)
+
+        # measures how much each connections contributes to the overall solution using back propagation
+        with timer.phase("learn_backward"):
+            loss.backward()
+
+        with timer.phase("learn_optimizer"):
+            self.Q_eval.optimizer.step()
+
+        self.learn_step_counter += 1
+        if self.Q_target is not None and self.learn_step_counter % self.target_update_interval == 0:
+            self.Q_target.load_state_dict(self.Q_eval.state_dict())
@@ -1,2 +1,3 @@
 from dql.gym_qwop.envs.custom_env import *
 from dql.gym_qwop.envs import character_simulation
+from dql.gym_qwop.envs.vector_env import QWOPVectorEnv, SubprocQWOPVectorEnv
@@ -2,7 +2,7 @@ import pyray as rl
 import pymunk as pm
 from math import degrees, radians
 import numpy as np
-from dql.gym_qwop.envs.util import gen_rect_verts, vec2d_to_arr
+from dql.gym_qwop.envs.util import gen_rect_verts
 
 
 class PhysicsLimb:
@@ -202,9 +202,27 @@ class Character:
         physics_space.add(self.body_left_leg_limit)
         physics_space.add(self.body_right_leg_limit)
 
-        self.prev_torso_pos = self.torso.body.position
-        self.prev_left_foot_pos = self.left_foot.body.position
-        self.prev_right_foot_pos = self.right_foot.body.position
+        # Fixed table of the bodies whose positions make up the character state, in the order they are written out
+        self.limb_bodies: list[pm.Body] = [
+            self.torso.body,
+            self.head.body,
+            self.right_forearm.body,
+            self.right_biceps.limb.body,
+            self.left_forearm.body,
+            self.left_biceps.limb.body,
+            self.right_leg.limb.body,
+            self.right_calf.limb.body,
+            self.right_foot.body,
+            self.left_leg.limb.body,
+            self.left_calf.limb.body,
+            self.left_foot.body,
+        ]
+
+        # positions of limb_bodies as of the last character_data_into call and before the last physics step,
+        # used for the delta features
+        self.positions: np.ndarray = np.asarray([value for body in self.limb_bodies for value in body.position],
+                                                dtype=np.float64).reshape(len(self.limb_bodies), 2)
+        self.prev_positions: np.ndarray = self.positions.copy()
 
     def draw(self, color: rl.Color, collided) -> None:
         self.left_leg.limb.draw(rl.GRAY)
@@ -266,36 +284,38 @@ class Character:
         self.right_calf.relax_muscle()
 
 
+# Indexes into Character.limb_bodies
+TORSO = 0
+RIGHT_FOOT = 8
+LEFT_FOOT = 11
+
+# Number of features written by character_data_into
+CHARACTER_DATA_SIZE = 29
+
+
+# Fill out with the character state:
+# y pos of the torso, how far the torso and both feet moved during the last step,
+# then x & y positions of the other limbs relative to the torso
+def character_data_into(character: Character, out: np.ndarray) -> np.ndarray:
+    positions = character.positions
+    for i, body in enumerate(character.limb_bodies):
+        positions[i, 0], positions[i, 1] = body.position
+    prev_positions = character.prev_positions
+
+    out[0] = positions[TORSO, 1]
+    np.subtract(positions[TORSO], prev_positions[TORSO], out=out[1:3])
+    np.subtract(positions[LEFT_FOOT], prev_positions[LEFT_FOOT], out=out[3:5])
+    np.subtract(positions[RIGHT_FOOT], prev_positions[RIGHT_FOOT], out=out[5:7])
+    np.subtract(positions[1:], positions[TORSO], out=out[7:CHARACTER_DATA_SIZE].reshape(-1, 2))
+    return out
+
+
+# Fill one row of out per character, e.g. a (N, 29) array for a whole population
+def population_data_into(characters: list[Character], out: np.ndarray) -> np.ndarray:
+    for i, character in enumerate(characters):
+        character_data_into(character, out[i])
+    return out
+
+
 def character_data_list(character: Character) -> list[float]:
-    # relative x & y positions of limbs relative to the body
-    # just y pos of the body
-    data: list[float] = [character.torso.body.position.y]
-    data.extend((character.torso.body.position.x - character.prev_torso_pos.x,
-                 character.torso.body.position.y - character.prev_torso_pos.y))
-    data.extend((character.left_foot.body.position.x - character.prev_left_foot_pos.x,
-                 character.left_foot.body.position.y - character.prev_left_foot_pos.y))
-    data.extend((character.right_foot.body.position.x - character.prev_right_foot_pos.x,
-                 character.right_foot.body.position.y - character.prev_right_foot_pos.y))
-    data.extend((character.head.body.position.x - character.torso.body.position.x,
-                 character.head.body.position.y - character.torso.body.position.y))
-    data.extend((character.right_forearm.body.position.x - character.torso.body.position.x,
-                 character.right_forearm.body.position.y - character.torso.body.position.y))
-    data.extend((character.right_biceps.limb.body.position.x - character.torso.body.position.x,
-                 character.right_biceps.limb.body.position.y - character.torso.body.position.y))
-    data.extend((character.left_forearm.body.position.x - character.torso.body.position.x,
-                 character.left_forearm.body.position.y - character.torso.body.position.y))
-    data.extend((character.left_biceps.limb.body.position.x - character.torso.body.position.x,
-                 character.left_biceps.limb.body.position.y - character.torso.body.position.y))
-    data.extend((character.right_leg.limb.body.position.x - character.torso.body.position.x,
-                 character.right_leg.limb.body.position.y - character.torso.body.position.y))
-    data.extend((character.right_calf.limb.body.position.x - character.torso.body.position.x,
-                 character.right_calf.limb.body.position.y - character.torso.body.position.y))
-    data.extend((character.right_foot.body.position.x - character.torso.body.position.x,
-                 character.right_foot.body.position.y - character.torso.body.position.y))
-    data.extend((character.left_leg.limb.body.position.x - character.torso.body.position.x,
-                 character.left_leg.limb.body.position.y - character.torso.body.position.y))
-    data.extend((character.left_calf.limb.body.position.x - character.torso.body.position.x,
-                 character.left_calf.limb.body.position.y - character.torso.body.position.y))
-    data.extend((character.left_foot.body.position.x - character.torso.body.position.x,
-                 character.left_foot.body.position.y - character.torso.body.position.y))
-    return data
+    return character_data_into(character, np.zeros(CHARACTER_DATA_SIZE)).tolist()
@@ -3,7 +3,7 @@ import pymunk as pm
 import numpy as np
 import random
 
-from dql.gym_qwop.envs.character import Character, character_data_list
+from dql.gym_qwop.envs.character import Character, character_data_into, CHARACTER_DATA_SIZE
 
 
 class CharacterSimulation:
@@ -11,8 +11,6 @@ class CharacterSimulation:
         self.camera = rl.Camera2D(rl.Vector2(1280 / 2, 720 / 2), rl.Vector2(0, 0), 0.0, 1.0)
 
         self.collided = False
-        self.space: pm.Space = pm.Space()
-        self.space.gravity = (0, -900.0)
 
         self.ground_position = 50, 150
         self.ground_poly = [
@@ -27,6 +25,22 @@ class CharacterSimulation:
         self.sub_sim_time: float = 0.0
         self.time_step = 1.0 / 60.0
 
+        self._build_space()
+
+        # features of the last step, written in place so no new array is made every step
+        self.outputs = character_data_into(self.character, np.zeros(CHARACTER_DATA_SIZE, dtype=np.float32))
+
+        self.fitness = 10.0
+
+        self.max_dist = 0.0
+
+        self.color = rl.color_from_hsv(random.uniform(0, 360), 0.7, 0.9)
+
+    # Space with the character in its initial pose and the ground
+    def _build_space(self) -> None:
+        self.space: pm.Space = pm.Space()
+        self.space.gravity = (0, -900.0)
+
         self.character: Character = Character(self.space, leg_muscle_strength=1_150_000.0, arm_muscle_strength=50_000.0)
 
         self.ground_body: pm.Body = pm.Body(body_type=pm.Body.STATIC)
@@ -37,17 +51,20 @@ class CharacterSimulation:
 
         self.space.add(self.ground_body, self.ground_shape)
 
-        self.outputs = np.asarray(character_data_list(self.character))
-
-        self.output_list = character_data_list(self.character)
+        self.handler = self.space.add_collision_handler(1, 2)
 
+    # Start a new episode: the space is built again (cached contacts and shape ids in a used space change the
+    # next episode, see src/character_simulation.py) and the episode counters are cleared, the camera and color
+    # are reused
+    def reset(self) -> None:
+        self._build_space()
+        self.collided = False
+        self.sim_time = 0.0
+        self.app_time = 0.0
+        self.sub_sim_time = 0.0
         self.fitness = 10.0
-
         self.max_dist = 0.0
-
-        self.color = rl.color_from_hsv(random.uniform(0, 360), 0.7, 0.9)
-
-        self.handler = self.space.add_collision_handler(1, 2)
+        character_data_into(self.character, self.outputs)
 
     def collision_detection(self, arbiter, space, data):
         self.collided = True
@@ -57,12 +74,9 @@ class CharacterSimulation:
 
     def step(self, time_step: float) -> None:
         self.fitness -= 0.01
-        self.character.prev_torso_pos = self.character.torso.body.position
-        self.character.prev_left_foot_pos = self.character.left_foot.body.position
-        self.character.prev_right_foot_pos = self.character.right_foot.body.position
+        self.character.prev_positions[:] = self.character.positions
         self.space.step(time_step)
-        self.outputs = np.asarray(character_data_list(self.character))
-        self.output_list = character_data_list(self.character)
+        character_data_into(self.character, self.outputs)
         if self.character_position().x > self.max_dist:
             self.fitness += (self.character_position().x - self.max_dist) / 50.0
             self.max_dist = self.character_position().x
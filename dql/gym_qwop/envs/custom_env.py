@@ -2,7 +2,6 @@ import gym
 from gym import spaces
 import numpy as np
 from dql.gym_qwop.envs import character_simulation
-import torch
 import pyray as rl
 import random
 
@@ -11,21 +10,41 @@ class CustomEnv(gym.Env):
     def __init__(self):
         self.pygame = character_simulation.CharacterSimulation()
         self.action_space = spaces.Discrete(4)
-        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, dtype=np.float32)
+        # character features + loop back flag + random value
+        self.observation_size: int = self.pygame.outputs.shape[0] + 2
+        self.observation_space = spaces.Box(low=-np.inf, high=np.inf, shape=(self.observation_size,),
+                                            dtype=np.float32)
         self.loop_back = 0
         self.rendered = False
+        # Observations are written into two preallocated float32 rows used in turn, so the observation returned
+        # by step() does not overwrite the one the caller still holds from the previous step.
+        # reset() and step() return read-only views of these rows: an observation stays valid until the second
+        # reset()/step() call after the one that returned it, copy it to keep it longer
+        self._observations: np.ndarray = np.zeros((2, self.observation_size), dtype=np.float32)
+        self._views: list[np.ndarray] = [row.view() for row in self._observations]
+        for view in self._views:
+            view.setflags(write=False)
+        self._slot: int = 0
+
+    # Write the current observation into out (e.g. a slot of the replay memory) and return it
+    def observe_into(self, out: np.ndarray) -> np.ndarray:
+        features = self.pygame.outputs.shape[0]
+        out[:features] = self.pygame.outputs
+        out[features] = self.loop_back
+        out[features + 1] = random.uniform(0, 1)
+        return out
+
+    def _observe(self) -> np.ndarray:
+        self._slot ^= 1
+        self.observe_into(self._observations[self._slot])
+        return self._views[self._slot]
 
     def reset(self, **kwargs):
-        del self.pygame
         self.loop_back = 0
-        self.pygame = character_simulation.CharacterSimulation()
-        observation = torch.tensor([*self.pygame.output_list, self.loop_back, random.uniform(0, 1)],
-                                   dtype=torch.float32)
-        return observation
+        self.pygame.reset()
+        return self._observe(), {}
 
     def step(self, action):
-        observation = torch.tensor([*self.pygame.output_list, self.loop_back, random.uniform(0, 1)],
-                                   dtype=torch.float32)
         self.loop_back = 0
         if action < 8:
             self.pygame.action(action)
@@ -36,6 +55,9 @@ class CustomEnv(gym.Env):
         if self.rendered:
             self.pygame.step_render()
 
+        # the observation is taken after the physics step so it is the state that resulted from the action
+        observation = self._observe()
+
         reward: float = (self.pygame.fitness * 0.5 + self.pygame.character_position().x) * 0.01
         # done will be connected to the collusion
         done = self.pygame.fitness <= 0
@@ -0,0 +1,116 @@
+import multiprocessing as mp
+
+import numpy as np
+
+from dql.gym_qwop.envs.custom_env import CustomEnv
+
+
+class QWOPVectorEnv:
+    # Steps num_envs independent QWOP environments (each with its own pymunk space) in this process.
+    # Observations, rewards and dones come back stacked with one row per env, and an env that finishes
+    # (done or max_episode_steps reached) is reset automatically. Its last observation is kept in
+    # infos[i]["final_observation"] and the returned row is the first observation of the new episode.
+    def __init__(self, num_envs: int, max_episode_steps: int = 2000):
+        self.num_envs: int = num_envs
+        self.max_episode_steps: int = max_episode_steps
+        self.envs: list[CustomEnv] = [CustomEnv() for _ in range(num_envs)]
+        self.episode_steps: np.ndarray = np.zeros(num_envs, dtype=np.int64)
+        self.observations: np.ndarray | None = None
+
+    def reset(self) -> np.ndarray:
+        first = self.envs[0].reset()[0]
+        self.observations = np.zeros((self.num_envs, *first.shape), dtype=np.float32)
+        self.observations[0] = first
+        for i in range(1, self.num_envs):
+            self.observations[i] = self.envs[i].reset()[0]
+        self.episode_steps[:] = 0
+        return self.observations.copy()
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=np.bool_)
+        truncated = np.zeros(self.num_envs, dtype=np.bool_)
+        infos: list[dict] = []
+
+        for i, env in enumerate(self.envs):
+            observation, rewards[i], dones[i], _, info = env.step(int(actions[i]))
+            self.observations[i] = observation
+            self.episode_steps[i] += 1
+            truncated[i] = not dones[i] and self.episode_steps[i] >= self.max_episode_steps
+            if dones[i] or truncated[i]:
+                info = dict(info, final_observation=self.observations[i].copy())
+                self.observations[i] = env.reset()[0]
+                self.episode_steps[i] = 0
+            infos.append(info)
+
+        return self.observations.copy(), rewards, dones, truncated, infos
+
+    def close(self) -> None:
+        for env in self.envs:
+            env.close()
+
+
+def _worker(remote, parent_remote, num_envs: int, max_episode_steps: int) -> None:
+    parent_remote.close()
+    vector_env = QWOPVectorEnv(num_envs, max_episode_steps)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                remote.send(vector_env.step(data))
+            elif command == "reset":
+                remote.send(vector_env.reset())
+            elif command == "close":
+                vector_env.close()
+                break
+    finally:
+        remote.close()
+
+
+class SubprocQWOPVectorEnv:
+    # Same interface as QWOPVectorEnv but the envs are split across worker processes,
+    # each worker stepping its share of the envs with a QWOPVectorEnv
+    def __init__(self, num_envs: int, num_workers: int | None = None, max_episode_steps: int = 2000):
+        self.num_envs: int = num_envs
+        num_workers = min(num_envs, num_workers if num_workers else mp.cpu_count())
+        # envs per worker, spread as evenly as possible
+        self.worker_sizes: list[int] = [len(chunk) for chunk in np.array_split(np.arange(num_envs), num_workers)]
+        self.worker_starts: np.ndarray = np.cumsum([0] + self.worker_sizes)
+
+        self.remotes = []
+        self.processes: list[mp.Process] = []
+        for size in self.worker_sizes:
+            remote, worker_remote = mp.Pipe()
+            process = mp.Process(target=_worker, args=(worker_remote, remote, size, max_episode_steps), daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.closed: bool = False
+
+    def reset(self) -> np.ndarray:
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return np.concatenate([remote.recv() for remote in self.remotes])
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        actions = np.asarray(actions)
+        for i, remote in enumerate(self.remotes):
+            remote.send(("step", actions[self.worker_starts[i]:self.worker_starts[i + 1]]))
+        results = [remote.recv() for remote in self.remotes]
+
+        infos: list[dict] = []
+        for result in results:
+            infos.extend(result[4])
+        return (np.concatenate([result[0] for result in results]), np.concatenate([result[1] for result in results]),
+                np.concatenate([result[2] for result in results]), np.concatenate([result[3] for result in results]),
+                infos)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
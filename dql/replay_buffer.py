@@ -0,0 +1,284 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    # Ring buffer of transitions with uniform sampling.
+    # Sampling draws batch_size random indices (with replacement) so the cost does not grow with max_size
+    def __init__(self, max_size: int, input_dims: list[int], rng: np.random.Generator | None = None):
+        self.mem_size: int = max_size
+        # to keep track of the position of the first available memory for storing the agent's memory
+        self.mem_cntr: int = 0
+        self.rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
+        self.state_memory: np.ndarray = np.zeros((self.mem_size, *input_dims), dtype=np.float32)
+        # memory of the states that resulted from agent's actions
+        # we are going to get the value of each action given the current state based on the earlier estimates
+        # we use one estimate to update another
+        self.new_state_memory: np.ndarray = np.zeros((self.mem_size, *input_dims), dtype=np.float32)
+
+        self.action_memory: np.ndarray = np.zeros(self.mem_size, dtype=np.int32)
+        self.reward_memory: np.ndarray = np.zeros(self.mem_size, dtype=np.float32)
+
+        # used to store the last few observations that the agent experiences before the end of an episode
+        # then we can update the estimates of the Q value
+        self.terminal_memory: np.ndarray = np.zeros(self.mem_size, dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return min(self.mem_cntr, self.mem_size)
+
+    # episode_start - state is the first observation of an episode, only FrameReplayBuffer needs to know
+    def store_transition(self, state: np.ndarray, action: int, reward: float, new_state: np.ndarray,
+                         done: bool, episode_start: bool = False) -> int:
+        index: int = self.mem_cntr % self.mem_size
+        self.state_memory[index] = state
+        self.new_state_memory[index] = new_state
+        self.reward_memory[index] = reward
+        self.action_memory[index] = action
+        self.terminal_memory[index] = done
+
+        self.mem_cntr += 1
+        return index
+
+    # Store a whole batch of transitions (rows of the arrays), returns their indices.
+    # episode_starts - per row episode_start of store_transition, None if no row starts an episode
+    def store_transitions(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, new_states: np.ndarray,
+                          dones: np.ndarray, episode_starts: np.ndarray | None = None) -> np.ndarray:
+        # a batch larger than the memory only keeps its last mem_size transitions
+        skip = max(0, len(states) - self.mem_size)
+        self.mem_cntr += skip
+        indices = (self.mem_cntr + np.arange(len(states) - skip)) % self.mem_size
+        self.state_memory[indices] = states[skip:]
+        self.new_state_memory[indices] = new_states[skip:]
+        self.reward_memory[indices] = rewards[skip:]
+        self.action_memory[indices] = actions[skip:]
+        self.terminal_memory[indices] = dones[skip:]
+
+        self.mem_cntr += len(indices)
+        return indices
+
+    def sample_indices(self, batch_size: int) -> tuple[np.ndarray, np.ndarray]:
+        indices = self.rng.integers(0, len(self), batch_size)
+        return indices, np.ones(batch_size, dtype=np.float32)
+
+    # Returns (indices, states, actions, rewards, new states, terminals, importance sampling weights)
+    def sample(self, batch_size: int) -> tuple[np.ndarray, ...]:
+        indices, weights = self.sample_indices(batch_size)
+        return (indices, self.state_memory[indices], self.action_memory[indices], self.reward_memory[indices],
+                self.new_state_memory[indices], self.terminal_memory[indices], weights)
+
+    # Uniform sampling ignores priorities
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        pass
+
+
+class FrameReplayBuffer(ReplayBuffer):
+    # ReplayBuffer that stores every observation once: inside an episode the next state of transition i is the
+    # state of transition i + 1, so slot i holds the state, action, reward and done of a transition and its next
+    # state is the frame in slot i + 1. That is half the memory of separate state and new state arrays.
+    # The caller marks the first transition of every episode (episode_start), the frames are never compared.
+    # Otherwise every transition is taken to continue the one stored before it, and its state overwrites the
+    # last next state. When an episode starts that frame stays in its slot as the end of the old episode (valid
+    # False, it is not the start of a transition) and the new episode starts one slot later. Writing a slot also
+    # overwrites the state of the oldest transition, so it holds up to max_size - 1 transitions, minus one slot
+    # per episode.
+    # Sampling rejects the slots that don't start a transition, they are usually a small fraction of the memory
+    def __init__(self, max_size: int, input_dims: list[int], rng: np.random.Generator | None = None):
+        if max_size < 3:
+            raise ValueError("a frame replay buffer needs at least 3 slots")
+        self.mem_size: int = max_size
+        # slots written so far, the next slot is mem_cntr % mem_size and holds the last next state
+        self.mem_cntr: int = 0
+        # transitions that can be sampled
+        self.transitions: int = 0
+        self.rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
+        self.frame_memory: np.ndarray = np.zeros((self.mem_size, *input_dims), dtype=np.float32)
+        self.action_memory: np.ndarray = np.zeros(self.mem_size, dtype=np.int32)
+        self.reward_memory: np.ndarray = np.zeros(self.mem_size, dtype=np.float32)
+        self.terminal_memory: np.ndarray = np.zeros(self.mem_size, dtype=np.bool_)
+        # the slot starts a transition whose next state is the following slot
+        self.valid: np.ndarray = np.zeros(self.mem_size, dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return self.transitions
+
+    # Mark the slots as no longer starting a transition
+    def _invalidate(self, indices) -> None:
+        self.transitions -= int(np.count_nonzero(self.valid[indices]))
+        self.valid[indices] = False
+
+    def store_transition(self, state: np.ndarray, action: int, reward: float, new_state: np.ndarray,
+                         done: bool, episode_start: bool = False) -> int:
+        index = self.mem_cntr % self.mem_size
+        if episode_start and self.mem_cntr > 0:
+            # a new episode, keep the next state of the last transition
+            self._invalidate(index)
+            self.mem_cntr += 1
+            index = self.mem_cntr % self.mem_size
+        next_index = (index + 1) % self.mem_size
+        self._invalidate([index, next_index])
+        self.frame_memory[index] = state
+        self.frame_memory[next_index] = new_state
+        self.action_memory[index] = action
+        self.reward_memory[index] = reward
+        self.terminal_memory[index] = done
+        self.valid[index] = True
+
+        self.transitions += 1
+        self.mem_cntr += 1
+        return index
+
+    def store_transitions(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, new_states: np.ndarray,
+                          dones: np.ndarray, episode_starts: np.ndarray | None = None) -> np.ndarray:
+        count = len(states)
+        if count == 0:
+            return np.zeros(0, dtype=np.int64)
+        # a row that starts an episode skips one slot
+        skips = np.zeros(count, dtype=np.int64)
+        if episode_starts is not None:
+            skips[:] = episode_starts
+            skips[0] &= self.mem_cntr > 0
+        offsets = np.arange(count) + np.cumsum(skips)
+        # a batch larger than the memory only keeps the rows whose slots it would not overwrite itself
+        # (the rows plus the last next state plus a possible skipped slot before the first row)
+        keep = offsets[-1] - offsets + 3 <= self.mem_size
+        if not keep[0]:
+            first = int(np.argmax(keep))
+            # the row before the first kept row is not stored, so the kept rows can't continue the last transition
+            kept_starts = np.zeros(count - first, dtype=np.bool_)
+            if episode_starts is not None:
+                kept_starts[:] = episode_starts[first:]
+            kept_starts[0] = True
+            return self.store_transitions(states[first:], actions[first:], rewards[first:], new_states[first:],
+                                          dones[first:], kept_starts)
+
+        # the rows, the skipped slots and the last next state fill the slots after mem_cntr
+        self._invalidate((self.mem_cntr + np.arange(offsets[-1] + 2)) % self.mem_size)
+        indices = (self.mem_cntr + offsets) % self.mem_size
+        self.frame_memory[(indices + 1) % self.mem_size] = new_states
+        self.frame_memory[indices] = states
+        self.action_memory[indices] = actions
+        self.reward_memory[indices] = rewards
+        self.terminal_memory[indices] = dones
+        self.valid[indices] = True
+
+        self.transitions += count
+        self.mem_cntr += int(offsets[-1]) + 1
+        return indices
+
+    def sample_indices(self, batch_size: int) -> tuple[np.ndarray, np.ndarray]:
+        if self.transitions == 0:
+            raise ValueError("the replay memory has no transitions to sample")
+        written = min(self.mem_cntr, self.mem_size)
+        indices = self.rng.integers(0, written, batch_size)
+        rejected = ~self.valid[indices]
+        # a few rounds of rejection are enough while most slots start a transition, with many short episodes in a
+        # small memory the rest is drawn from the list of valid slots
+        for _ in range(3):
+            if not rejected.any():
+                break
+            indices[rejected] = self.rng.integers(0, written, int(np.count_nonzero(rejected)))
+            rejected = ~self.valid[indices]
+        if rejected.any():
+            valid = np.flatnonzero(self.valid[:written])
+            indices[rejected] = valid[self.rng.integers(0, len(valid), int(np.count_nonzero(rejected)))]
+        return indices, np.ones(batch_size, dtype=np.float32)
+
+    def sample(self, batch_size: int) -> tuple[np.ndarray, ...]:
+        indices, weights = self.sample_indices(batch_size)
+        return (indices, self.frame_memory[indices], self.action_memory[indices], self.reward_memory[indices],
+                self.frame_memory[(indices + 1) % self.mem_size], self.terminal_memory[indices], weights)
+
+
+class SumTree:
+    # Binary tree stored in a flat array where every node holds the sum of its children.
+    # Node 1 is the root, node i has children 2i and 2i + 1, and the leaves are [capacity, 2 * capacity).
+    # Updates and searches work on whole batches of indices, one NumPy operation per tree level
+    def __init__(self, size: int):
+        self.depth: int = max(1, int(np.ceil(np.log2(size))))
+        self.capacity: int = 2 ** self.depth
+        self.tree: np.ndarray = np.zeros(2 * self.capacity, dtype=np.float64)
+
+    @property
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    def __getitem__(self, indices: np.ndarray) -> np.ndarray:
+        return self.tree[np.asarray(indices) + self.capacity]
+
+    def update(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        nodes = np.asarray(indices, dtype=np.int64) + self.capacity
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    # Single leaf version of update(), used once per stored transition
+    def set(self, index: int, priority: float) -> None:
+        node = index + self.capacity
+        self.tree[node] = priority
+        node //= 2
+        while node >= 1:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            node //= 2
+
+    # For every value in [0, total) find the leaf whose prefix sum range contains it
+    def find(self, values: np.ndarray) -> np.ndarray:
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(values.shape[0], dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values >= left_sum
+            values -= left_sum * go_right
+            nodes = left + go_right
+        return nodes - self.capacity
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    # Proportional prioritized replay (Schaul et al.): transitions are sampled with probability p^alpha / sum(p^alpha)
+    # where p is the last absolute TD error, and the bias is corrected with importance sampling weights
+    # (N * P(i))^-beta, beta annealing towards 1
+    def __init__(self, max_size: int, input_dims: list[int], rng: np.random.Generator | None = None,
+                 alpha: float = 0.6, beta: float = 0.4, beta_increment: float = 0.000001, epsilon: float = 0.00001):
+        super().__init__(max_size, input_dims, rng)
+        self.alpha: float = alpha
+        self.beta: float = beta
+        self.beta_increment: float = beta_increment
+        self.epsilon: float = epsilon
+        self.max_priority: float = 1.0
+        self.tree = SumTree(max_size)
+
+    def store_transition(self, state: np.ndarray, action: int, reward: float, new_state: np.ndarray,
+                         done: bool, episode_start: bool = False) -> int:
+        index = super().store_transition(state, action, reward, new_state, done, episode_start)
+        # new transitions get the highest priority seen so far so they are replayed at least once
+        self.tree.set(index, self.max_priority ** self.alpha)
+        return index
+
+    def store_transitions(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, new_states: np.ndarray,
+                          dones: np.ndarray, episode_starts: np.ndarray | None = None) -> np.ndarray:
+        indices = super().store_transitions(states, actions, rewards, new_states, dones, episode_starts)
+        self.tree.update(indices, np.full(len(indices), self.max_priority ** self.alpha))
+        return indices
+
+    def sample_indices(self, batch_size: int) -> tuple[np.ndarray, np.ndarray]:
+        total = self.tree.total
+        # stratified sampling: one value from each of batch_size equal segments of the total priority
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = self.tree.find(np.minimum(values, np.nextafter(total, 0)))
+        # guard against floating point drift landing on an unused leaf
+        indices = np.minimum(indices, len(self) - 1)
+
+        probabilities = self.tree[indices] / total
+        weights = (len(self) * probabilities) ** -self.beta
+        weights /= weights.max()
+        self.beta = min(1.0, self.beta + self.beta_increment)
+        return indices, weights.astype(np.float32)
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        # the last write wins for indices that were sampled more than once
+        self.tree.update(indices, priorities ** self.alpha)
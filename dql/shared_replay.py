@@ -0,0 +1,234 @@
+import os
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Replay memory in one block of shared memory or in a memory-mapped file, so env workers write transitions
+# straight into it and the learner samples from it without anything being pickled or copied between processes.
+# The memory is split into segments, one per writer, and each segment is a ring with its own write counter:
+# the writer fills a row and only then bumps the counter, readers only sample rows below the counter.
+# A segment has exactly one writer, so the counters need no lock. Rows just ahead of the write position may
+# be half written when the ring wraps, so readers skip `guard` rows ahead of every writer and writers publish at
+# least every `guard` rows, and after copying a batch readers check the counters again and draw the rows a writer
+# reached in the meantime again (see sample). The guard is part of the header, so writers and readers agree on it.
+# (numpy stores land in program order and x86 does not reorder stores, so a reader that sees the counter
+# also sees the row.)
+# A file backed store survives a learner restart: opening the file again picks up the counters and the data.
+MAGIC = b"QWOPREPL"
+VERSION = 2
+_HEADER = struct.Struct("<8sIIIII")  # magic, version, segments, segment capacity, observation size, guard
+_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+# Byte offset of every array for a store of this shape, and the total size
+def _layout(segments: int, segment_capacity: int, observation_size: int) -> tuple[dict[str, tuple], int]:
+    rows = segments * segment_capacity
+    shapes = {
+        "counters": ((segments,), np.uint64),
+        "state_memory": ((rows, observation_size), np.float32),
+        "new_state_memory": ((rows, observation_size), np.float32),
+        "action_memory": ((rows,), np.int32),
+        "reward_memory": ((rows,), np.float32),
+        "terminal_memory": ((rows,), np.bool_),
+    }
+    layout = {}
+    offset = _align(_HEADER.size)
+    for name, (shape, dtype) in shapes.items():
+        layout[name] = (offset, shape, dtype)
+        offset = _align(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return layout, offset
+
+
+class SharedReplayBuffer:
+    # Use create() or attach() instead of calling this directly
+    def __init__(self, buffer, segments: int, segment_capacity: int, observation_size: int, guard: int,
+                 rng: np.random.Generator | None, shm: shared_memory.SharedMemory | None = None):
+        self._buffer = buffer
+        self._shm = shm
+        self.segments: int = segments
+        self.segment_capacity: int = segment_capacity
+        self.observation_size: int = observation_size
+        self.mem_size: int = segments * segment_capacity
+        self.guard: int = guard
+        self.rng: np.random.Generator = rng if rng is not None else np.random.default_rng()
+
+        layout, _ = _layout(segments, segment_capacity, observation_size)
+        for name, (offset, shape, dtype) in layout.items():
+            count = int(np.prod(shape))
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).reshape(shape)
+            setattr(self, name, array)
+
+    # path: file backed store (opened instead of created if the file already has a store of this shape),
+    # otherwise a shared memory block called name (or a generated name, see self.name)
+    @classmethod
+    def create(cls, segments: int, segment_capacity: int, observation_size: int, path: str | None = None,
+               name: str | None = None, guard: int = 64, rng: np.random.Generator | None = None):
+        if guard >= segment_capacity:
+            raise ValueError("guard must be smaller than the segment capacity")
+        header = _HEADER.pack(MAGIC, VERSION, segments, segment_capacity, observation_size, guard)
+        _, size = _layout(segments, segment_capacity, observation_size)
+
+        if path is not None:
+            if os.path.exists(path) and os.path.getsize(path) == size:
+                store = cls.attach(path=path, rng=rng)
+                if (store.segments, store.segment_capacity, store.observation_size, store.guard) == (
+                        segments, segment_capacity, observation_size, guard):
+                    return store
+                store.close()
+            buffer = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+            buffer[:_HEADER.size] = np.frombuffer(header, dtype=np.uint8)
+            return cls(buffer, segments, segment_capacity, observation_size, guard, rng)
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:_HEADER.size] = header
+        # fresh shared memory is zeroed, so every counter starts at 0
+        return cls(shm.buf, segments, segment_capacity, observation_size, guard, rng, shm)
+
+    # Open an existing store from another process
+    @classmethod
+    def attach(cls, path: str | None = None, name: str | None = None, rng: np.random.Generator | None = None):
+        shm = None
+        if path is not None:
+            buffer = np.memmap(path, dtype=np.uint8, mode="r+")
+            header = buffer[:_HEADER.size].tobytes()
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            buffer = shm.buf
+            header = bytes(buffer[:_HEADER.size])
+        magic, version, segments, segment_capacity, observation_size, guard = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a replay store: " + str(path if path is not None else name))
+        return cls(buffer, segments, segment_capacity, observation_size, guard, rng, shm)
+
+    @property
+    def name(self) -> str | None:
+        return self._shm.name if self._shm is not None else None
+
+    # Transitions ever written, like ReplayBuffer.mem_cntr
+    @property
+    def mem_cntr(self) -> int:
+        return int(self.counters.sum())
+
+    # Transitions that can be sampled right now
+    def __len__(self) -> int:
+        return int(self._readable(self.counters.copy()).sum())
+
+    def _readable(self, counters: np.ndarray) -> np.ndarray:
+        return np.minimum(counters, self.segment_capacity - self.guard).astype(np.int64)
+
+    def writer(self, segment: int) -> "SegmentWriter":
+        return SegmentWriter(self, segment)
+
+    # Draw rows uniformly from the readable rows of the counters snapshot, returns their segments and
+    # write numbers (the counter value the row was written at)
+    def _draw(self, batch_size: int, counters: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        readable = self._readable(counters)
+        # pick a position in the concatenation of the readable parts of the segments
+        positions = self.rng.integers(0, readable.sum(), batch_size)
+        cumulative = np.cumsum(readable)
+        segments = np.searchsorted(cumulative, positions, side="right")
+        positions -= cumulative[segments] - readable[segments]
+        # the readable rows are the newest ones behind the counter
+        return segments, counters[segments] - readable[segments] + positions
+
+    def sample_indices(self, batch_size: int) -> tuple[np.ndarray, np.ndarray]:
+        segments, numbers = self._draw(batch_size, self.counters.astype(np.int64))
+        return segments * self.segment_capacity + numbers % self.segment_capacity, np.ones(batch_size, dtype=np.float32)
+
+    # Same tuple as ReplayBuffer.sample, so an Agent can learn from the store directly
+    def sample(self, batch_size: int) -> tuple[np.ndarray, ...]:
+        counters = self.counters.astype(np.int64)
+        segments, numbers = self._draw(batch_size, counters)
+        indices = segments * self.segment_capacity + numbers % self.segment_capacity
+        states, actions, rewards = self.state_memory[indices], self.action_memory[indices], self.reward_memory[indices]
+        new_states, terminals = self.new_state_memory[indices], self.terminal_memory[indices]
+        # The guard band only helps if the reader copies faster than the writers fill it. Like a seqlock, check
+        # the counters again after the copy: a writer at counter c may be writing up to c + guard - 1, which
+        # overwrites the rows written at c + guard - 1 - capacity and before. Those are drawn again
+        while True:
+            counters = self.counters.astype(np.int64)
+            torn = numbers < counters[segments] + self.guard - self.segment_capacity
+            if not torn.any():
+                break
+            segments[torn], numbers[torn] = self._draw(int(np.count_nonzero(torn)), counters)
+            indices[torn] = segments[torn] * self.segment_capacity + numbers[torn] % self.segment_capacity
+            states[torn], actions[torn] = self.state_memory[indices[torn]], self.action_memory[indices[torn]]
+            rewards[torn], new_states[torn] = self.reward_memory[indices[torn]], self.new_state_memory[indices[torn]]
+            terminals[torn] = self.terminal_memory[indices[torn]]
+        return indices, states, actions, rewards, new_states, terminals, np.ones(batch_size, dtype=np.float32)
+
+    # Uniform sampling ignores priorities
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        pass
+
+    def flush(self) -> None:
+        if isinstance(self._buffer, np.memmap):
+            self._buffer.flush()
+
+    def close(self) -> None:
+        # drop the views first, shared memory can't be closed while arrays still point into it
+        for name in ("counters", "state_memory", "new_state_memory", "action_memory", "reward_memory",
+                     "terminal_memory"):
+            setattr(self, name, None)
+        if self._shm is not None:
+            self._shm.close()
+        else:
+            self._buffer.flush()
+        self._buffer = None
+
+    # Free the shared memory block, call it once from the process that created it
+    def unlink(self) -> None:
+        if self._shm is not None:
+            self._shm.unlink()
+
+
+# The only process writing into one segment of a SharedReplayBuffer
+class SegmentWriter:
+    def __init__(self, store: SharedReplayBuffer, segment: int):
+        self.store: SharedReplayBuffer = store
+        self.segment: int = segment
+        self.start: int = segment * store.segment_capacity
+        # only this writer changes the counter, so a local copy stays valid
+        self.counter: int = int(store.counters[segment])
+
+    def store_transition(self, state: np.ndarray, action: int, reward: float, new_state: np.ndarray,
+                         done: bool) -> int:
+        store = self.store
+        index = self.start + self.counter % store.segment_capacity
+        store.state_memory[index] = state
+        store.new_state_memory[index] = new_state
+        store.action_memory[index] = action
+        store.reward_memory[index] = reward
+        store.terminal_memory[index] = done
+        # publish the row
+        self.counter += 1
+        store.counters[self.segment] = self.counter
+        return index
+
+    def store_transitions(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, new_states: np.ndarray,
+                          dones: np.ndarray) -> np.ndarray:
+        store = self.store
+        # more rows than fit before the guard band would overwrite rows readers may be copying
+        limit = store.segment_capacity - store.guard
+        if len(states) > limit:
+            self.counter += len(states) - limit
+            states, actions, rewards = states[-limit:], actions[-limit:], rewards[-limit:]
+            new_states, dones = new_states[-limit:], dones[-limit:]
+        indices = self.start + (self.counter + np.arange(len(states))) % store.segment_capacity
+        # publish after every guard rows, readers only skip the guard band ahead of the published counter
+        for start in range(0, len(indices), store.guard):
+            end = start + store.guard
+            rows = indices[start:end]
+            store.state_memory[rows] = states[start:end]
+            store.new_state_memory[rows] = new_states[start:end]
+            store.action_memory[rows] = actions[start:end]
+            store.reward_memory[rows] = rewards[start:end]
+            store.terminal_memory[rows] = dones[start:end]
+            self.counter += len(rows)
+            store.counters[self.segment] = self.counter
+        return indices
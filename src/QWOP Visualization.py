@@ -11,6 +11,9 @@ import matplotlib.pyplot as plt
 
 import os
 import glob
+
+from run_log import RunLogReader
+
 pd.set_option('expand_frame_repr', False)
 #df = pd.read_json("out/0/1.json")
 #df.head()
@@ -18,42 +21,42 @@ pd.set_option('expand_frame_repr', False)
 
 directory = "0"
 
-temp = []                           
-agg_df = pd.DataFrame()             
+# The GA run log written by headless.py (see run_log.py): one record per generation, the per-generation
+# stats come straight from its index
+run = RunLogReader(os.path.join(directory, "run.qlog"))
+summary = run.summary()
 
-for filename in os.listdir(directory):
-    f = os.path.join(directory, filename)
-    if os.path.isfile(f):
-        temp.append(f)
-      
-def sortLen(item):
-    return len(item)
+# fitness of every runner of every generation, in generation order
+agg_df = pd.DataFrame({
+    "generation": np.repeat(summary["generation"], summary["count"]),
+    "fitness": np.concatenate([record.fitness for record in run]) if len(run) > 0 else np.zeros(0),
+})
 
-temp.sort(key=sortLen)       
-      
-for i in temp:
-    agg_df = pd.concat([agg_df, pd.read_json(i, lines = True)] ) 
-    
+# The DQL episodes (dql/main.py writes one <episode>.json per episode), in episode order
+episode_files = [f for f in glob.glob(os.path.join(directory, "*.json"))
+                 if os.path.splitext(os.path.basename(f))[0].isdigit()]
+episode_files.sort(key=lambda f: int(os.path.splitext(os.path.basename(f))[0]))
 
-agg_df = agg_df.drop(['network'], axis = 1)
+episode_df = pd.concat([pd.read_json(f, lines = True) for f in episode_files]) if episode_files else \
+    pd.DataFrame(columns = ["episode", "score", "max_reward", "avg_score", "epsilon"])
 
-agg_df.plot.line(x = 'episode', y = 'max_reward',
-                 xlabel = 'Episode #', ylabel = 'Max Reward',
-                 color = 'gold')
+episode_df.plot.line(x = 'episode', y = 'max_reward',
+                     xlabel = 'Episode #', ylabel = 'Max Reward',
+                     color = 'gold')
 plt.savefig('max_reward.png', dpi=1200, bbox_inches ="tight")
 
-agg_df.plot.line(x = 'episode', y = 'epsilon', xlabel = 'Episode #', ylabel = 'Epsilon')
+episode_df.plot.line(x = 'episode', y = 'epsilon', xlabel = 'Episode #', ylabel = 'Epsilon')
 
-agg_df.plot.line(x = 'episode', y = 'score',
-                 xlabel = 'Episode #', ylabel = 'Score',
-                 color = 'green')
+episode_df.plot.line(x = 'episode', y = 'score',
+                     xlabel = 'Episode #', ylabel = 'Score',
+                     color = 'green')
 plt.savefig('score.png', dpi=1200, bbox_inches ="tight")
 
-agg_df.plot.line(x = 'episode', y = 'avg_score', xlabel = 'Episode #', ylabel = 'Average Score')
+episode_df.plot.line(x = 'episode', y = 'avg_score', xlabel = 'Episode #', ylabel = 'Average Score')
 
-agg_df.plot.line(x = 'epsilon', y = 'avg_score', xlabel = 'Epsilon', ylabel = 'Average Score')
+episode_df.plot.line(x = 'epsilon', y = 'avg_score', xlabel = 'Epsilon', ylabel = 'Average Score')
 
-agg_df.plot.line(x = 'epsilon', y = 'max_reward', xlabel = 'Epsilon', ylabel = 'Reward')
+episode_df.plot.line(x = 'epsilon', y = 'max_reward', xlabel = 'Epsilon', ylabel = 'Reward')
 
 '''
 fig, ax = plt.subplots(figsize=(12,5))
@@ -74,8 +77,8 @@ plt.savefig('max_reward_epsilon.png', dpi=1200, bbox_inches ="tight")
 fig, ax = plt.subplots(figsize=(10,7)) #12x5
 ax2 = ax.twinx()
 ax.set_title('Average Score and Epsilon For Each Episode')
-ax.plot(agg_df['episode'], agg_df['avg_score'], color='green', marker='.')
-ax2.plot(agg_df['episode'], agg_df['epsilon'], color='gold', marker='x')
+ax.plot(episode_df['episode'], episode_df['avg_score'], color='green', marker='.')
+ax2.plot(episode_df['episode'], episode_df['epsilon'], color='gold', marker='x')
 ax.set_ylabel('avg_score')
 ax2.set_ylabel('Epsilon')
 ax.legend(['avg_score'])
@@ -113,8 +116,7 @@ bin_df = agg_df.groupby(pd.cut(agg_df['fitness'], bins=bins)).fitness.count()
 bin_df.plot(kind='bar', xlabel = "Fitness Value", ylabel = "Number of Runners",
             color = "gold", title = "Frequency of Fitness Values", rot = 45)
 
-bars = plt.hist(data)
-plt.bar_label(bars)
+plt.bar_label(plt.gca().containers[0])
 plt.savefig('fit_freq.png', dpi=1200, bbox_inches ="tight")
 
 
@@ -122,7 +124,6 @@ plt.savefig('fit_freq.png', dpi=1200, bbox_inches ="tight")
 #agg_df.plot.bar(xlabel = 'Generation #', ylabel = 'Fitness') #TO-DO fix or remove
 
 
-temp_df = agg_df.drop(['color'], axis = 1)
 '''
 avg_df = pd.DataFrame( [ agg_df[0:100].mean() ,agg_df[100:200].mean(),
                         agg_df[200:300].mean(), agg_df[300:400].mean(),
@@ -131,17 +132,8 @@ avg_df = pd.DataFrame( [ agg_df[0:100].mean() ,agg_df[100:200].mean(),
                         agg_df[800:900].mean(), agg_df[900:1000].mean() ])
 '''
 
-avg_df = pd.DataFrame()
-for i in range( int(len(agg_df.index) / 100) ):
-    avg_df = pd.concat([avg_df, temp_df[(i*100):(i*100 + 100)].mean()] )
-    
-
-gen_num = []
-for i in range( int(len(agg_df.index) / 100) ):
-    gen_num.append(i)
-
-avg_df = avg_df.set_axis(gen_num) 
-avg_df = avg_df.rename(columns = {0 : "fitness"} )
+# mean fitness of every generation from the run log index, no record is read
+avg_df = pd.DataFrame({"fitness": summary["mean"]}, index = summary["generation"] - 1)
 
 #xticks = [0, 84, 168, 252, 336, 420, 504, 588, 672, 756 ]
 avg_df.plot.line(title = "Average Fitness For Each Generation", legend = False,
@@ -1,8 +1,9 @@
 import pyray as rl
 import pymunk as pm
+import numpy as np
 from math import degrees, radians
 
-from util import gen_rect_verts, vec2d_to_arr
+from util import gen_rect_verts
 
 
 class PhysicsLimb:
@@ -68,7 +69,10 @@ class PhysicsLimbWithMuscle:
 
 
 class Character:
-    def __init__(self, physics_space: pm.Space, leg_muscle_strength: float, arm_muscle_strength: float):
+    # shape_filter replaces the default ShapeFilter(group=1) of every limb, e.g. to keep characters that share
+    # a space from touching each other
+    def __init__(self, physics_space: pm.Space, leg_muscle_strength: float, arm_muscle_strength: float,
+                 shape_filter: pm.ShapeFilter | None = None):
         # Body parts
         self.torso = PhysicsLimb(physics_space, group=1, width=40, height=150, mass=0.5, friction=1,
                                  position=(200, 600), collision_type=1)
@@ -204,6 +208,27 @@ class Character:
         physics_space.add(self.body_left_leg_limit)
         physics_space.add(self.body_right_leg_limit)
 
+        # Fixed table of the bodies whose positions make up the character state, in the order they are written out
+        self.limb_bodies: list[pm.Body] = [
+            self.torso.body,
+            self.head.body,
+            self.right_forearm.body,
+            self.right_biceps.limb.body,
+            self.left_forearm.body,
+            self.left_biceps.limb.body,
+            self.right_leg.limb.body,
+            self.right_calf.limb.body,
+            self.right_foot.body,
+            self.left_leg.limb.body,
+            self.left_calf.limb.body,
+            self.left_foot.body,
+        ]
+
+        if shape_filter is not None:
+            for body in self.limb_bodies + [self.neck.limb.body]:
+                for shape in body.shapes:
+                    shape.filter = shape_filter
+
     def draw(self, color: rl.Color, collided) -> None:
         self.left_leg.limb.draw(rl.GRAY)
         self.left_calf.limb.draw(rl.GRAY)
@@ -264,18 +289,34 @@ class Character:
         self.right_calf.relax_muscle()
 
 
+# Move the character based on the 4 network outputs (q, w, o, p)
+def drive_character(character: Character, outputs: np.ndarray) -> None:
+    if outputs[0] >= 0.5 > outputs[1]:
+        character.move_legs_q()
+    if outputs[1] >= 0.5 > outputs[0]:
+        character.move_legs_w()
+    if outputs[2] >= 0.5 > outputs[3]:
+        character.move_knees_o()
+    if outputs[3] >= 0.5 > outputs[2]:
+        character.move_knees_p()
+
+
+# Positions of every body in character.limb_bodies written into out (x, y per body), e.g. a float32 array.
+# The values go straight into out, no list or temporary array is made per call
+def character_data_into(character: Character, out: np.ndarray) -> np.ndarray:
+    i = 0
+    for body in character.limb_bodies:
+        out[i], out[i + 1] = body.position
+        i += 2
+    return out
+
+
+# Fill one row of out per character, e.g. the (N, 24) input array of a whole population
+def population_data_into(characters: list[Character], out: np.ndarray) -> np.ndarray:
+    for character, row in zip(characters, out):
+        character_data_into(character, row)
+    return out
+
+
 def character_data_list(character: Character) -> list[float]:
-    data: list[float] = []
-    data.extend(vec2d_to_arr(character.torso.body.position))
-    data.extend(vec2d_to_arr(character.head.body.position))
-    data.extend(vec2d_to_arr(character.right_forearm.body.position))
-    data.extend(vec2d_to_arr(character.right_biceps.limb.body.position))
-    data.extend(vec2d_to_arr(character.left_forearm.body.position))
-    data.extend(vec2d_to_arr(character.left_biceps.limb.body.position))
-    data.extend(vec2d_to_arr(character.right_leg.limb.body.position))
-    data.extend(vec2d_to_arr(character.right_calf.limb.body.position))
-    data.extend(vec2d_to_arr(character.right_foot.body.position))
-    data.extend(vec2d_to_arr(character.left_leg.limb.body.position))
-    data.extend(vec2d_to_arr(character.left_calf.limb.body.position))
-    data.extend(vec2d_to_arr(character.left_foot.body.position))
-    return data
+    return [value for body in character.limb_bodies for value in body.position]
@@ -3,51 +3,119 @@ import pymunk as pm
 import numpy as np
 import random
 
-from character import Character, character_data_list
-from neural_network import NeuralNetwork
-
+from character import Character, character_data_into, population_data_into, drive_character
+from neural_network import NeuralNetwork, PopulationNetwork
+from physics_schedule import PhysicsSchedule
+from phase_timer import timer
+
+# The ground every simulation runs on: a long flat box at GROUND_POSITION, GROUND_POLY are its vertices
+GROUND_POSITION = 50, 150
+GROUND_POLY = [
+    (-50000, -25),
+    (-50000, 25),
+    (50000, 25),
+    (50000, -25),
+]
 
 class CharacterSimulation:
-    def __init__(self, ground_position: tuple[float, float], ground_poly: list[tuple[float, float]]):
+    # rng: generator for the random network and color, the global random state is used if None.
+    # neural_network and color replace the random ones, nothing is drawn for the ones that are given (e.g. children)
+    def __init__(self, ground_position: tuple[float, float], ground_poly: list[tuple[float, float]],
+                 rng: np.random.Generator | None = None, schedule: PhysicsSchedule | None = None,
+                 neural_network: NeuralNetwork | None = None, color: "rl.Color | None" = None):
         self.collided = False
+        # head or torso touched the ground, set by the begin callback for the whole episode
+        self.fallen = False
+        self.schedule: PhysicsSchedule = schedule if schedule is not None else PhysicsSchedule()
+        # ticks since the start of the episode
+        self.ticks = 0
+
+        self._ground_position = ground_position
+        self._ground_poly = ground_poly
+        self._build_space()
+
+        self.neural_network: NeuralNetwork = neural_network if neural_network is not None else NeuralNetwork(rng=rng)
+
+        # network inputs (float32), refilled in place every step
+        self.inputs = character_data_into(self.character,
+                                          np.zeros(len(self.character.limb_bodies) * 2, dtype=np.float32))
+        self.outputs = np.zeros(4)
+
+        self.fitness = 0.0
+
+        if color is None:
+            color = rl.color_from_hsv(rng.uniform(0, 360) if rng is not None else random.uniform(0, 360), 0.7, 0.9)
+        self.color = color
+
+    # Space with the character in its initial pose and the ground
+    def _build_space(self) -> None:
         self.space: pm.Space = pm.Space()
         self.space.gravity = (0, -900.0)
+        self.space.iterations = self.schedule.iterations
 
         self.character: Character = Character(self.space, leg_muscle_strength=1_000_000.0, arm_muscle_strength=50_000.0)
 
         ground_body: pm.Body = pm.Body(body_type=pm.Body.STATIC)
-        ground_body.position = ground_position
-        ground_shape = pm.Poly(ground_body, ground_poly)
+        ground_body.position = self._ground_position
+        ground_shape = pm.Poly(ground_body, self._ground_poly)
         ground_shape.friction = 0.8
         ground_shape.collision_type = pm.Body.STATIC
 
         self.space.add(ground_body, ground_shape)
 
-        self.neural_network: NeuralNetwork = NeuralNetwork()
-
-        self.outputs = np.asarray(character_data_list(self.character))
-
-        self.fitness = 0.0
-
-        self.color = rl.color_from_hsv(random.uniform(0, 360), 0.7, 0.9)
-
         self.handler = self.space.add_collision_handler(1, 2)
+        self.handler.begin = self.fall_detection
+
+    # Start a new episode from the initial pose, reusing the network and color. schedule replaces the physics
+    # schedule for the new episode if given.
+    # The space is built again instead of moving the bodies back: Chipmunk keeps cached contact arbiters,
+    # broadphase pairs and shape ids in the space, and they change the next episode. A new space (~1.4 ms) is
+    # bit for bit the same as a fresh sim and cheaper than copying a template space (pickle ~2.6 ms,
+    # Space.copy ~8 ms)
+    def reset(self, schedule: PhysicsSchedule | None = None) -> None:
+        if schedule is not None:
+            self.schedule = schedule
+        self._build_space()
+        self.collided = False
+        self.fallen = False
+        self.ticks = 0
+        self.fitness = 0.0
+        self.outputs = np.zeros(4)
+        character_data_into(self.character, self.inputs)
 
     def collision_detection(self, arbiter, space, data):
         self.collided = True
 
+    # Arms touching the ground is fine, only the head or torso counts as a fall
+    def fall_detection(self, arbiter, space, data) -> bool:
+        for shape in arbiter.shapes:
+            if shape.body is self.character.torso.body or shape.body is self.character.head.body:
+                self.fallen = True
+        return True
+
+    # Advance one tick of time_step seconds, see PhysicsSchedule
     def step(self, time_step: float) -> None:
-        self.space.step(time_step)
-        inputs = np.asarray(character_data_list(self.character))
-        self.outputs = self.neural_network.feedforward(inputs)
-        if self.outputs[0] >= 0.5 > self.outputs[1]:
-            self.character_move_legs_q()
-        if self.outputs[1] >= 0.5 > self.outputs[0]:
-            self.character_move_legs_w()
-        if self.outputs[2] >= 0.5 > self.outputs[3]:
-            self.character_move_knees_o()
-        if self.outputs[3] >= 0.5 > self.outputs[2]:
-            self.character_move_knees_p()
+        with timer.phase("physics"):
+            self.physics_step(time_step)
+        if self.schedule.is_control_tick(self.ticks):
+            with timer.phase("state"):
+                character_data_into(self.character, self.inputs)
+            with timer.phase("feedforward"):
+                outputs = self.neural_network.feedforward(self.inputs)
+            with timer.phase("drive"):
+                self.apply_outputs(outputs)
+
+    def physics_step(self, time_step: float) -> None:
+        substeps = self.schedule.substeps
+        for _ in range(substeps):
+            self.space.step(time_step / substeps)
+        self.ticks += 1
+
+    # Move the character based on the network outputs. Split from step() so a population can
+    # run its networks in one batch (see PopulationNetwork) and then drive each character
+    def apply_outputs(self, outputs: np.ndarray) -> None:
+        self.outputs = outputs
+        drive_character(self.character, outputs)
 
     def output_data(self) -> dict:
         data = {
@@ -78,3 +146,30 @@ class CharacterSimulation:
 
     def character_move_knees_p(self) -> None:
         self.character.move_knees_p()
+
+
+# Step a whole population with one batched forward pass (network is a PopulationNetwork or an engine of inference.py
+# built from the sims' networks, in order).
+# Sims outside the active mask are frozen: their space is not stepped and their outputs are not applied.
+# Only the sims on a control tick of their schedule get new outputs
+def step_population(sim_list: list[CharacterSimulation], network: PopulationNetwork, time_step: float,
+                    active: np.ndarray | None = None) -> None:
+    control = np.zeros(len(sim_list), dtype=np.bool_)
+    with timer.phase("physics"):
+        for i, sim in enumerate(sim_list):
+            if active is None or active[i]:
+                sim.physics_step(time_step)
+                control[i] = sim.schedule.is_control_tick(sim.ticks)
+    if not control.any():
+        return
+
+    with timer.phase("state"):
+        inputs = np.empty((len(sim_list), sim_list[0].inputs.shape[0]), dtype=np.float32)
+        population_data_into([sim.character for sim in sim_list], inputs)
+    with timer.phase("feedforward"):
+        outputs = network.feedforward(inputs)
+    with timer.phase("drive"):
+        for i, sim in enumerate(sim_list):
+            if control[i]:
+                sim.inputs[:] = inputs[i]
+                sim.apply_outputs(outputs[i])
@@ -0,0 +1,117 @@
+import json
+import struct
+
+import numpy as np
+import pyray as rl
+
+from character_simulation import CharacterSimulation
+from neural_network import NeuralNetwork
+
+# Binary generation checkpoint.
+# Layout: magic, version, header length, JSON header, then one 64-byte aligned blob per array.
+# The header maps each array name to its dtype, shape and offset so the file can be memory mapped
+# and every array read without copying.
+CHECKPOINT_MAGIC = b"QWOPCKPT"
+CHECKPOINT_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+# Stack the genomes, fitness and color of a generation into flat arrays. The weights are float32 by default,
+# half the size of the float64 weights of NeuralNetwork. dtype=np.float64 stores them exactly
+def pack_population(sim_list: list[CharacterSimulation], dtype: type = np.float32) -> dict[str, np.ndarray]:
+    return {
+        "weights_ih": np.stack([sim.neural_network.weights_ih for sim in sim_list]).astype(dtype),
+        "weights_ho": np.stack([sim.neural_network.weights_ho for sim in sim_list]).astype(dtype),
+        "bias_ih": np.asarray([sim.neural_network.bias_ih for sim in sim_list], dtype=dtype),
+        "bias_ho": np.asarray([sim.neural_network.bias_ho for sim in sim_list], dtype=dtype),
+        "fitness": np.asarray([sim.fitness for sim in sim_list], dtype=np.float32),
+        "color": np.asarray([(sim.color.r, sim.color.g, sim.color.b, sim.color.a) for sim in sim_list],
+                            dtype=np.uint8),
+    }
+
+
+# Load a packed population into existing sims (one sim per packed genome), like CharacterSimulation.load_data.
+# The weight matrices of the networks are views into the arrays (e.g. into the memory map of read_checkpoint),
+# nothing is copied. They keep the dtype of the checkpoint and are read-only if the arrays are
+def load_population(arrays: dict[str, np.ndarray], sim_list: list[CharacterSimulation]) -> None:
+    for i, sim in enumerate(sim_list):
+        network: NeuralNetwork = sim.neural_network
+        network.weights_ih = arrays["weights_ih"][i]
+        network.weights_ho = arrays["weights_ho"][i]
+        network.bias_ih = float(arrays["bias_ih"][i])
+        network.bias_ho = float(arrays["bias_ho"][i])
+        sim.fitness = float(arrays["fitness"][i])
+        sim.color = rl.Color(*(int(c) for c in arrays["color"][i]))
+
+
+# Rebuild the sims of a packed population
+def unpack_population(arrays: dict[str, np.ndarray], ground_position: tuple[float, float],
+                      ground_poly: list[tuple[float, float]]) -> list[CharacterSimulation]:
+    sim_list = [CharacterSimulation(ground_position, ground_poly) for _ in range(arrays["fitness"].shape[0])]
+    load_population(arrays, sim_list)
+    return sim_list
+
+
+def encode_checkpoint(arrays: dict[str, np.ndarray]) -> bytes:
+    header: dict[str, dict] = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        header[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    data = bytearray(data_start + offset)
+    data[:_PREFIX.size] = _PREFIX.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(header_bytes))
+    data[_PREFIX.size:_PREFIX.size + len(header_bytes)] = header_bytes
+    for name, array in arrays.items():
+        start = data_start + header[name]["offset"]
+        array_bytes = np.ascontiguousarray(array).tobytes()
+        data[start:start + len(array_bytes)] = array_bytes
+    return bytes(data)
+
+
+# buffer is a uint8 array (usually a slice of a memory map), the returned arrays are views into it
+def decode_checkpoint(buffer: np.ndarray) -> dict[str, np.ndarray]:
+    magic, version, header_length = _PREFIX.unpack(buffer[:_PREFIX.size].tobytes())
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError("not a QWOP checkpoint")
+    if version != CHECKPOINT_VERSION:
+        raise ValueError("unsupported checkpoint version " + str(version))
+
+    header = json.loads(buffer[_PREFIX.size:_PREFIX.size + header_length].tobytes())
+    data_start = _align(_PREFIX.size + header_length)
+
+    arrays: dict[str, np.ndarray] = {}
+    for name, info in header.items():
+        dtype = np.dtype(info["dtype"])
+        count = int(np.prod(info["shape"], dtype=np.int64))
+        start = data_start + info["offset"]
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(info["shape"])
+    return arrays
+
+
+def write_checkpoint(path: str, arrays: dict[str, np.ndarray]) -> None:
+    with open(path, "wb") as file:
+        file.write(encode_checkpoint(arrays))
+
+
+# Returns read-only views into a memory map of the file, nothing is copied until the arrays are used
+def read_checkpoint(path: str) -> dict[str, np.ndarray]:
+    return decode_checkpoint(np.memmap(path, dtype=np.uint8, mode="r"))
+
+
+def save_checkpoint(path: str, sim_list: list[CharacterSimulation], dtype: type = np.float32) -> None:
+    write_checkpoint(path, pack_population(sim_list, dtype))
+
+
+def load_checkpoint(path: str, ground_position: tuple[float, float],
+                    ground_poly: list[tuple[float, float]]) -> list[CharacterSimulation]:
+    return unpack_population(read_checkpoint(path), ground_position, ground_poly)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from character_simulation import CharacterSimulation, GROUND_POSITION, GROUND_POLY
+from neural_network import NeuralNetwork
+from termination import TerminationPolicy, PopulationTermination
+from physics_schedule import PhysicsSchedule
+
+
+class EpisodeResult:
+    def __init__(self, fitness: float, trajectory: np.ndarray, fallen: bool, termination_reason: int):
+        self.fitness: float = fitness
+        # torso x after every step, trajectory[0] is the start position
+        self.trajectory: np.ndarray = trajectory
+        self.fallen: bool = fallen
+        self.termination_reason: int = termination_reason
+
+    @property
+    def steps(self) -> int:
+        return len(self.trajectory) - 1
+
+    @property
+    def max_x(self) -> float:
+        return float(self.trajectory.max())
+
+    @property
+    def final_x(self) -> float:
+        return float(self.trajectory[-1])
+
+
+# The simulation evaluate() runs its episodes in, one per process
+_sim: CharacterSimulation | None = None
+
+
+# Run one episode as a pure function of its arguments: a fixed number of fixed-size steps (no wall clock)
+# and every random draw comes from a generator seeded with seed (the global random states are never touched).
+# genome is a NeuralNetwork.output_data() dict, with None the network is drawn from the seed as well.
+# Every episode after the first reuses the simulation of the process through CharacterSimulation.reset(),
+# which is bit for bit the same as a new character, so the same arguments give bitwise identical results in
+# any process and in any order
+def evaluate(genome: dict | None, seed: int, n_steps: int, time_step: float = 1.0 / 60.0,
+             policy: TerminationPolicy | None = None, schedule: PhysicsSchedule | None = None) -> EpisodeResult:
+    global _sim
+    rng = np.random.default_rng(seed)
+    if genome is not None:
+        network = NeuralNetwork.from_weights(np.asarray(genome["weights_ih"]), np.asarray(genome["weights_ho"]),
+                                             genome["bias_ih"], genome["bias_ho"])
+    else:
+        network = NeuralNetwork(rng=rng)
+    if _sim is None:
+        _sim = CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng, schedule, network)
+    else:
+        _sim.reset(schedule if schedule is not None else PhysicsSchedule())
+        _sim.neural_network = network
+    sim = _sim
+    termination = PopulationTermination(policy, [sim]) if policy is not None else None
+
+    trajectory = np.empty(n_steps + 1)
+    trajectory[0] = sim.character.torso.body.position.x
+    steps = 0
+    while steps < n_steps:
+        sim.step(time_step)
+        steps += 1
+        trajectory[steps] = sim.character.torso.body.position.x
+        if termination is not None and not termination.update(steps * time_step)[0]:
+            break
+    trajectory = trajectory[:steps + 1]
+
+    if termination is not None:
+        final_x = termination.final_x[0]
+        reason = int(termination.reasons[0])
+    else:
+        final_x = trajectory[-1]
+        reason = 0
+    return EpisodeResult(round(final_x, 0) / 1000.0, trajectory, sim.fallen, reason)
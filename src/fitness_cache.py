@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+from character_simulation import CharacterSimulation
+from neural_network import NeuralNetwork
+
+
+# Hash of everything that decides the fitness of a network: its weights and biases (float64 bytes)
+# and the episode configuration (any repr-able value, e.g. a tuple of the episode settings)
+def genome_key(network: NeuralNetwork, config) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(network.weights_ih, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(network.weights_ho, dtype=np.float64).tobytes())
+    digest.update(np.asarray([network.bias_ih, network.bias_ho], dtype=np.float64).tobytes())
+    digest.update(repr(config).encode())
+    return digest.hexdigest()
+
+
+# LRU cache of fitness values keyed by genome_key(). Elites and duplicate children are looked up
+# instead of simulated again. With a path the cache is loaded from and saved to a JSON file
+# (oldest entry first, so the LRU order survives a restart)
+class FitnessCache:
+    def __init__(self, max_size: int = 10_000, path: str | None = None):
+        self.max_size: int = max_size
+        self.path: str | None = path
+        self.entries: OrderedDict[str, float] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> float | None:
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key: str, fitness: float) -> None:
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    # Set the fitness of every sim, calling simulate() only for the genomes that are not cached yet
+    # (one sim per distinct genome, so duplicate children are simulated once). simulate() has to set the
+    # fitness of the sims it is given
+    def evaluate_sims(self, sim_list: list[CharacterSimulation], config,
+                      simulate: Callable[[list[CharacterSimulation]], None]) -> None:
+        keys = [genome_key(sim.neural_network, config) for sim in sim_list]
+        known: dict[str, float] = {}
+        pending: dict[str, CharacterSimulation] = {}
+        for sim, key in zip(sim_list, keys):
+            if key in known or key in pending:
+                continue
+            fitness = self.get(key)
+            if fitness is None:
+                pending[key] = sim
+            else:
+                known[key] = fitness
+
+        if pending:
+            simulate(list(pending.values()))
+        for key, sim in pending.items():
+            self.put(key, sim.fitness)
+            known[key] = sim.fitness
+        for sim, key in zip(sim_list, keys):
+            sim.fitness = known[key]
+
+    def load(self, path: str) -> None:
+        with open(path) as file:
+            for key, fitness in json.load(file).items():
+                self.put(key, fitness)
+
+    def save(self, path: str | None = None) -> None:
+        path = path if path is not None else self.path
+        if path is None:
+            return
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # write then rename so an interrupted save never leaves a half written cache
+        with open(path + ".tmp", "w") as file:
+            json.dump(self.entries, file)
+        os.replace(path + ".tmp", path)
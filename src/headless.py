@@ -0,0 +1,220 @@
+import argparse
+import os
+
+import numpy as np
+
+from character_simulation import CharacterSimulation, step_population, GROUND_POSITION, GROUND_POLY
+from next_gen import make_next_gen_batched
+import main as window_main
+from main import output_data
+from checkpoint import pack_population
+from run_log import RunLogWriter
+from inference import ENGINES, make_engine
+from parallel import PopulationEvaluator
+from termination import TerminationPolicy, PopulationTermination
+from population_simulation import PopulationSimulation
+from fitness_cache import FitnessCache
+from physics_schedule import PhysicsSchedule
+from phase_timer import timer
+
+
+# Simulate one batch of characters with the same timing rules as the window loop in main.py.
+# The batch runs for at least subgen_duration seconds and keeps going while any character is still
+# setting a new max distance within subgen_duration_bonus seconds (capped by max_duration).
+# With a termination policy, characters that are done stop being simulated and the batch ends early once
+# all of them are done. Sets the fitness of every sim in the batch.
+# population_mode "shared" runs the batch in one PopulationSimulation space instead of the sims' own spaces,
+# with the same fitness
+def run_subgen(sim_list: list[CharacterSimulation], time_step: float, subgen_duration: float,
+               subgen_duration_bonus: float, max_duration: float, policy: TerminationPolicy | None = None,
+               inference: str = "exact", population_mode: str = "isolated") -> None:
+    sub_sim_time: float = 0.0
+    last_max = 0
+    last_max_time = 0.0
+    population: PopulationSimulation | None = None
+    if population_mode == "shared":
+        population = PopulationSimulation(GROUND_POSITION, GROUND_POLY, [sim.neural_network for sim in sim_list],
+                                          schedule=sim_list[0].schedule, inference=inference)
+        members = population.members
+    else:
+        network = make_engine([sim.neural_network for sim in sim_list], inference)
+        members = sim_list
+    termination = PopulationTermination(policy, members) if policy is not None else None
+    active = None
+
+    while sub_sim_time < max_duration:
+        if population is not None:
+            population.step(time_step, active)
+        else:
+            step_population(sim_list, network, time_step, active)
+        sub_sim_time += time_step
+
+        if termination is not None:
+            active = termination.update(sub_sim_time)
+            if not active.any():
+                break
+
+        max_x = max(member.character_position().x for member in members)
+        if max_x > last_max:
+            last_max = max_x
+            last_max_time = sub_sim_time
+
+        if sub_sim_time >= subgen_duration and sub_sim_time - last_max_time >= subgen_duration_bonus:
+            break
+
+    if population is not None:
+        for sim, member, fitness in zip(sim_list, members, population.fitness(
+                termination.final_x if termination is not None else None)):
+            sim.fitness = float(fitness)
+            sim.fallen = member.fallen
+    elif termination is not None:
+        for sim, x in zip(sim_list, termination.final_x):
+            sim.fitness = round(x, 0) / 1000.0
+    else:
+        for sim in sim_list:
+            sim.fitness = round(sim.character_position().x, 0) / 1000.0
+
+
+# Run the sims batch_size at a time
+def run_batches(sim_list: list[CharacterSimulation], batch_size: int, time_step: float, subgen_duration: float,
+                subgen_duration_bonus: float, max_duration: float, policy: TerminationPolicy | None = None,
+                inference: str = "exact", population_mode: str = "isolated") -> None:
+    for start in range(0, len(sim_list), batch_size):
+        run_subgen(sim_list[start:start + batch_size], time_step, subgen_duration, subgen_duration_bonus,
+                   max_duration, policy, inference, population_mode)
+
+
+# Sort by fitness, keep the top 50% as parents and breed the next generation.
+# The top 5 are carried over and reset to the start pose so they are re-simulated from the start,
+# every other sim is reset and reused for a child (the child networks are new arrays, so no parent is affected)
+def next_generation(sim_list: list[CharacterSimulation], rng: np.random.Generator) -> list[CharacterSimulation]:
+    with timer.phase("selection"):
+        generation_list: list[CharacterSimulation] = sorted(sim_list, key=lambda x: x.fitness)
+
+        half_index = len(generation_list) // 2
+        elites = generation_list[len(generation_list) - 5:len(generation_list)]
+        sim_pool = generation_list[0:len(generation_list) - 5]
+        generation_list = generation_list[half_index:len(generation_list)]
+
+    with timer.phase("breeding"):
+        children_list = make_next_gen_batched(generation_list, rng, num_children=len(sim_pool), sim_pool=sim_pool)
+        for elite in elites:
+            elite.reset()
+            children_list.append(elite)
+
+    return children_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the QWOP genetic algorithm without a window")
+    parser.add_argument("--generations", type=int, default=0, help="number of generations to run (0 runs forever)")
+    parser.add_argument("--batch-size", type=int, default=10, help="characters simulated per sub-generation")
+    parser.add_argument("--subgen-seconds", type=float, default=3.0, help="minimum simulated time per sub-generation")
+    parser.add_argument("--bonus-seconds", type=float, default=3.0,
+                        help="extra time given while a character keeps moving past the max distance")
+    parser.add_argument("--max-subgen-seconds", type=float, default=30.0,
+                        help="hard cap on simulated time per sub-generation")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="evaluate each generation on a pool of worker processes (0 steps the sims in-process)")
+    parser.add_argument("--episode-seconds", type=float, default=6.0,
+                        help="fixed episode length used by the worker pool")
+    parser.add_argument("--format", choices=["json", "ckpt"], default="ckpt",
+                        help="file format of the per-generation output in out/<run>/")
+    parser.add_argument("--log-genomes", action="store_true",
+                        help="also store every genome in out/<run>/run.qlog, not only the fitness")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="stop simulating characters that fell, stopped moving forward or blew up")
+    parser.add_argument("--stagnation-seconds", type=float, default=3.0,
+                        help="with --early-stop, seconds without forward progress before a character is stopped")
+    parser.add_argument("--cache-size", type=int, default=0,
+                        help="remember the fitness of this many genomes and skip simulating them again (0 disables)")
+    parser.add_argument("--cache-file", type=str, default=None,
+                        help="JSON file the fitness cache is loaded from and saved to after every generation")
+    parser.add_argument("--tick-rate", type=int, default=60, help="simulation ticks per simulated second")
+    parser.add_argument("--substeps", type=int, default=1, help="physics steps per tick")
+    parser.add_argument("--control-interval", type=int, default=1, help="ticks between two network decisions")
+    parser.add_argument("--iterations", type=int, default=10, help="physics solver iterations")
+    parser.add_argument("--inference", choices=["exact", "auto"] + list(ENGINES), default="exact",
+                        help="population network engine: exact (float64), a float32 engine or auto (the fastest "
+                             "float32 engine for the batch size)")
+    parser.add_argument("--population-mode", choices=["isolated", "shared"], default="isolated",
+                        help="in-process batches run every character in its own space (isolated) or the whole "
+                             "batch in one space (shared), the fitness is the same")
+    parser.add_argument("--profile", type=float, default=None, metavar="SECONDS",
+                        help="print the time spent per phase every SECONDS seconds")
+    parser.add_argument("--profile-trace", type=str, default=None,
+                        help="with --profile, also write a Chrome trace of the first phase calls to this file")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed for the first generation, parent selection, crossover and mutation")
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        timer.enable(args.profile, 1_000_000 if args.profile_trace else 0)
+
+    time_step = 1.0 / args.tick_rate
+    schedule = PhysicsSchedule(args.substeps, args.control_interval, args.iterations)
+    rng = np.random.default_rng(args.seed)
+
+    policy: TerminationPolicy | None = None
+    if args.early_stop:
+        policy = TerminationPolicy(stagnation_seconds=args.stagnation_seconds)
+
+    # In-process batches depend on the other characters of the batch (the bonus time), so there a cached
+    # fitness is the first measurement of the genome. The worker pool runs fixed, deterministic episodes
+    cache: FitnessCache | None = None
+    if args.cache_size > 0:
+        cache = FitnessCache(args.cache_size, args.cache_file)
+
+    evaluator: PopulationEvaluator | None = None
+    if args.workers > 0:
+        evaluator = PopulationEvaluator(args.workers, round(args.episode_seconds / time_step), time_step, policy,
+                                        cache, schedule)
+
+    run_log = RunLogWriter(os.path.join('out', str(window_main.dir_count), "run.qlog"))
+
+    # create 100 random characters for the 1st generation
+    sim_list: list[CharacterSimulation] = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng, schedule)
+                                           for _ in range(100)]
+
+    gen_count = 1
+    while args.generations <= 0 or gen_count <= args.generations:
+        if evaluator is not None:
+            # the workers' own phases are not visible from here
+            with timer.phase("evaluate"):
+                evaluator.evaluate_sims(sim_list)
+        else:
+            batch_settings = (args.batch_size, time_step, args.subgen_seconds, args.bonus_seconds,
+                              args.max_subgen_seconds, policy, args.inference, args.population_mode)
+            if cache is not None:
+                cache.evaluate_sims(sim_list, ("subgen", schedule) + batch_settings,
+                                    lambda pending: run_batches(pending, *batch_settings))
+            else:
+                run_batches(sim_list, *batch_settings)
+        with timer.phase("persistence"):
+            if cache is not None:
+                cache.save()
+
+            generation_list: list[CharacterSimulation] = sorted(sim_list, key=lambda x: x.fitness)
+            output_data(gen_count, generation_list, args.format)
+            run_log.append(gen_count, [sim.fitness for sim in generation_list],
+                           pack_population(generation_list) if args.log_genomes else None)
+
+        print("Gen: " + str(gen_count) + " Max Fitness: " + str(generation_list[-1].fitness) + " Avg Fitness: " +
+              str(round(sum(sim.fitness for sim in sim_list) / len(sim_list), 3)) +
+              ("" if cache is None else " Cache hits: " + str(cache.hits) + "/" + str(cache.hits + cache.misses)))
+
+        sim_list = next_generation(generation_list, rng)
+        gen_count += 1
+        timer.maybe_report()
+
+    run_log.close()
+    if args.profile is not None:
+        print(timer.summary())
+        if args.profile_trace:
+            timer.export_chrome_trace(args.profile_trace)
+    if evaluator is not None:
+        evaluator.close()
+
+
+if __name__ == "__main__":
+    main()
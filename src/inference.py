@@ -0,0 +1,178 @@
+import argparse
+import importlib.util
+import time
+
+import numpy as np
+
+from neural_network import NeuralNetwork, PopulationNetwork
+
+# Pluggable engines for evaluating a whole population of networks at once. Every engine loads the same flat
+# genome matrix (see GenomeLayout) and has the feedforward() of PopulationNetwork, so step_population can use any
+# of them. "numpy" is a float32 NumPy engine, "torch" a float32 torch.bmm engine (only if torch is installed) and
+# "auto" times the available engines for the population size and keeps the fastest.
+# "exact" is PopulationNetwork itself, float64 like NeuralNetwork, so its runs match the single network path
+
+
+# One row per network: [weights_ih, bias_ih, weights_ho, bias_ho], the weight matrices flattened row by row
+class GenomeLayout:
+    def __init__(self, input_nodes: int = 24, hidden_nodes: int = 12, output_nodes: int = 4):
+        self.input_nodes: int = input_nodes
+        self.hidden_nodes: int = hidden_nodes
+        self.output_nodes: int = output_nodes
+        self.ih_size: int = hidden_nodes * (input_nodes + 1)
+        self.ho_size: int = output_nodes * (hidden_nodes + 1)
+        self.size: int = self.ih_size + 1 + self.ho_size + 1
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, GenomeLayout) and self.shape == other.shape
+
+    def __hash__(self) -> int:
+        return hash(self.shape)
+
+    @property
+    def shape(self) -> tuple[int, int, int]:
+        return self.input_nodes, self.hidden_nodes, self.output_nodes
+
+    def pack(self, networks: list[NeuralNetwork]) -> np.ndarray:
+        genomes = np.empty((len(networks), self.size))
+        for genome, network in zip(genomes, networks):
+            genome[:self.ih_size] = network.weights_ih.ravel()
+            genome[self.ih_size] = network.bias_ih
+            genome[self.ih_size + 1:-1] = network.weights_ho.ravel()
+            genome[-1] = network.bias_ho
+        return genomes
+
+    def unpack(self, genome: np.ndarray, network: NeuralNetwork) -> None:
+        network.weights_ih = np.array(genome[:self.ih_size], dtype=np.float64).reshape(self.hidden_nodes, -1)
+        network.bias_ih = float(genome[self.ih_size])
+        network.weights_ho = np.array(genome[self.ih_size + 1:-1], dtype=np.float64).reshape(self.output_nodes, -1)
+        network.bias_ho = float(genome[-1])
+
+    # Per network weight matrices and per neuron biases: the constant bias input of NeuralNetwork times its
+    # weight column is the same for every call, so it is folded into one bias vector per layer.
+    # Returns weights_ih (N, hidden, inputs), bias_ih (N, hidden), weights_ho (N, outputs, hidden), bias_ho (N, outputs)
+    def split(self, genomes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        count = genomes.shape[0]
+        weights_ih = genomes[:, :self.ih_size].reshape(count, self.hidden_nodes, self.input_nodes + 1)
+        weights_ho = genomes[:, self.ih_size + 1:-1].reshape(count, self.output_nodes, self.hidden_nodes + 1)
+        bias_ih = weights_ih[:, :, -1] * genomes[:, self.ih_size, None]
+        bias_ho = weights_ho[:, :, -1] * genomes[:, -1, None]
+        return weights_ih[:, :, :-1], bias_ih, weights_ho[:, :, :-1], bias_ho
+
+
+class NumpyEngine:
+    def __init__(self, genomes: np.ndarray, layout: GenomeLayout):
+        self.layout: GenomeLayout = layout
+        self.weights_ih, self.bias_ih, self.weights_ho, self.bias_ho = (
+            np.ascontiguousarray(array, dtype=np.float32) for array in layout.split(genomes))
+
+    def __len__(self) -> int:
+        return self.weights_ih.shape[0]
+
+    # inputs is (N, input_nodes) with one row per network, returns (N, output_nodes)
+    def feedforward(self, inputs: np.ndarray) -> np.ndarray:
+        inputs = inputs.astype(np.float32)
+        hidden = np.matmul(self.weights_ih, inputs[:, :, None])[:, :, 0]
+        hidden += self.bias_ih
+        # 1 / (1 + e^-x) without the clip of util.sigmoid, float32 exp overflows to inf and that still gives 0
+        with np.errstate(over="ignore"):
+            hidden = 1 / (1 + np.exp(-hidden))
+            outputs = np.matmul(self.weights_ho, hidden[:, :, None])[:, :, 0]
+            outputs += self.bias_ho
+            return 1 / (1 + np.exp(-outputs))
+
+
+class TorchEngine:
+    def __init__(self, genomes: np.ndarray, layout: GenomeLayout):
+        import torch
+
+        self.torch = torch
+        self.layout: GenomeLayout = layout
+        self.weights_ih, self.bias_ih, self.weights_ho, self.bias_ho = (
+            torch.from_numpy(np.ascontiguousarray(array, dtype=np.float32)) for array in layout.split(genomes))
+
+    def __len__(self) -> int:
+        return self.weights_ih.shape[0]
+
+    def feedforward(self, inputs: np.ndarray) -> np.ndarray:
+        torch = self.torch
+        with torch.no_grad():
+            inputs = torch.from_numpy(inputs.astype(np.float32))
+            hidden = torch.sigmoid(torch.baddbmm(self.bias_ih[:, :, None], self.weights_ih, inputs[:, :, None]))
+            outputs = torch.sigmoid(torch.baddbmm(self.bias_ho[:, :, None], self.weights_ho, hidden))
+            return outputs[:, :, 0].numpy()
+
+
+ENGINES = {
+    "numpy": NumpyEngine,
+}
+# torch is optional and slow to import, it is only imported once a torch engine is made
+if importlib.util.find_spec("torch") is not None:
+    ENGINES["torch"] = TorchEngine
+
+# Engine picked by "auto" per (population size, layout), timing them once per process is enough
+_fastest: dict[tuple[int, GenomeLayout], str] = {}
+
+
+# Seconds per feedforward() call of every float32 engine on a random population of this size
+def time_engines(population: int, layout: GenomeLayout, calls: int = 200, repeat: int = 3) -> dict[str, float]:
+    rng = np.random.default_rng(0)
+    genomes = rng.standard_normal((population, layout.size))
+    inputs = rng.standard_normal((population, layout.input_nodes))
+    times = {}
+    for name in ENGINES:
+        engine = ENGINES[name](genomes, layout)
+        engine.feedforward(inputs)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(calls):
+                engine.feedforward(inputs)
+            best = min(best, time.perf_counter() - start)
+        times[name] = best / calls
+    return times
+
+
+def fastest_engine(population: int, layout: GenomeLayout) -> str:
+    key = population, layout
+    if key not in _fastest:
+        times = time_engines(population, layout)
+        _fastest[key] = min(times, key=times.get)
+    return _fastest[key]
+
+
+# Engine for the networks (all with the same layout), backend is "exact", "auto" or a name of ENGINES
+def make_engine(networks: list[NeuralNetwork], backend: str = "exact"):
+    if backend == "exact":
+        return PopulationNetwork(networks)
+    layout = GenomeLayout(networks[0].weights_ih.shape[1] - 1, networks[0].weights_ih.shape[0],
+                          networks[0].weights_ho.shape[0])
+    if backend == "auto":
+        backend = fastest_engine(len(networks), layout)
+    if backend not in ENGINES:
+        raise ValueError("unknown inference backend " + backend + ", available: exact, auto, " + ", ".join(ENGINES))
+    return ENGINES[backend](layout.pack(networks), layout)
+
+
+# Compare the engines for a few population sizes and check they agree with the exact one
+def main():
+    parser = argparse.ArgumentParser(description="Time the population inference engines")
+    parser.add_argument("sizes", type=int, nargs="*", default=[10, 100, 1000, 10000], help="population sizes")
+    args = parser.parse_args()
+
+    layout = GenomeLayout()
+    rng = np.random.default_rng(0)
+    for population in args.sizes:
+        networks = [NeuralNetwork(rng=rng) for _ in range(population)]
+        inputs = rng.standard_normal((population, layout.input_nodes))
+        exact = make_engine(networks, "exact").feedforward(inputs)
+        errors = {name: float(np.abs(make_engine(networks, name).feedforward(inputs) - exact).max())
+                  for name in ENGINES}
+        times = time_engines(population, layout)
+        print("population " + str(population) + ": " +
+              ", ".join(name + " %.1f us (max error %.1e)" % (times[name] * 1e6, errors[name]) for name in times) +
+              ", fastest " + min(times, key=times.get))
+
+
+if __name__ == "__main__":
+    main()
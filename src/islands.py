@@ -0,0 +1,198 @@
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from multiprocessing.queues import Queue
+
+import numpy as np
+
+from character_simulation import CharacterSimulation, GROUND_POSITION, GROUND_POLY
+from checkpoint import pack_population, unpack_population, encode_checkpoint, decode_checkpoint
+from headless import run_batches, next_generation
+import main as window_main
+
+
+# Island model: several populations evolve on their own (one process each) and every migration_interval
+# generations each island sends copies of its best genomes to the next island of a ring. Islands never wait
+# for each other, migrants that arrived since the last migration simply replace the worst sims of the island.
+# Migrants travel as encoded checkpoints (float32 weights, see checkpoint.py).
+# The ring can continue on other machines: the last island of a node sends to the node at next_node,
+# and a node started with listen forwards everything it receives to its first island
+
+
+# Encoded checkpoint holding the count fittest sims
+def migrants_blob(sim_list: list[CharacterSimulation], count: int) -> bytes:
+    best = sorted(sim_list, key=lambda x: x.fitness)[len(sim_list) - count:]
+    return encode_checkpoint(pack_population(best))
+
+
+# Replace the worst sims with the migrants of blob, returns the new population (same size)
+def accept_migrants(sim_list: list[CharacterSimulation], blob: bytes) -> list[CharacterSimulation]:
+    migrants = unpack_population(decode_checkpoint(np.frombuffer(blob, dtype=np.uint8)), GROUND_POSITION,
+                                 GROUND_POLY)
+    migrants = migrants[:len(sim_list)]
+    return sorted(sim_list, key=lambda x: x.fitness)[len(migrants):] + migrants
+
+
+class IslandSettings:
+    def __init__(self, population: int = 100, generations: int = 50, migration_interval: int = 5,
+                 migrants: int = 2, batch_size: int = 10, subgen_seconds: float = 3.0, bonus_seconds: float = 3.0,
+                 max_subgen_seconds: float = 30.0):
+        self.population: int = population
+        self.generations: int = generations
+        self.migration_interval: int = migration_interval
+        self.migrants: int = migrants
+        self.batch_size: int = batch_size
+        self.subgen_seconds: float = subgen_seconds
+        self.bonus_seconds: float = bonus_seconds
+        self.max_subgen_seconds: float = max_subgen_seconds
+
+
+# Where an island sends its migrants: the inbox of another island on this node, or a node listening at address
+class MigrationTarget:
+    def __init__(self, inbox: Queue | None = None, address: tuple[str, int] | None = None,
+                 authkey: bytes | None = None):
+        self.inbox = inbox
+        self.address: tuple[str, int] | None = address
+        self.authkey: bytes | None = authkey
+
+    def send(self, blob: bytes) -> None:
+        if self.inbox is not None:
+            self.inbox.put(blob)
+            return
+        # migrations are rare, a connection per send keeps the nodes independent of each other's restarts
+        try:
+            with Client(self.address, authkey=self.authkey) as connection:
+                connection.send_bytes(blob)
+        except (OSError, AuthenticationError) as error:
+            print("migration to " + str(self.address) + " failed: " + str(error))
+
+
+def run_island(index: int, seed: np.random.SeedSequence, settings: IslandSettings, inbox: Queue,
+               target: MigrationTarget, results: Queue) -> None:
+    rng = np.random.default_rng(seed)
+    time_step = 1.0 / 60.0
+    sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng) for _ in range(settings.population)]
+
+    for gen_count in range(1, settings.generations + 1):
+        run_batches(sim_list, settings.batch_size, time_step, settings.subgen_seconds, settings.bonus_seconds,
+                    settings.max_subgen_seconds)
+        fitness = np.asarray([sim.fitness for sim in sim_list])
+        results.put(("generation", index, gen_count, float(fitness.max()), float(fitness.mean())))
+
+        if gen_count % settings.migration_interval == 0:
+            target.send(migrants_blob(sim_list, settings.migrants))
+            while True:
+                try:
+                    blob = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                sim_list = accept_migrants(sim_list, blob)
+
+        if gen_count < settings.generations:
+            sim_list = next_generation(sim_list, rng)
+
+    results.put(("done", index, encode_checkpoint(pack_population(sorted(sim_list, key=lambda x: x.fitness)))))
+    # the next island may be done already and never read its inbox again, don't wait at exit for the migrants
+    # still buffered for it to be flushed
+    if target.inbox is not None:
+        target.inbox.cancel_join_thread()
+
+
+# Accept connections from the previous node of the ring and hand the migrants to the first local island
+def forward_migrants(listener: Listener, inbox: Queue) -> None:
+    while True:
+        try:
+            connection = listener.accept()
+        except OSError:
+            # the listener was closed
+            return
+        except AuthenticationError:
+            continue
+        with connection:
+            try:
+                inbox.put(connection.recv_bytes())
+            except EOFError:
+                pass
+
+
+def parse_address(text: str) -> tuple[str, int]:
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evolve several QWOP populations in parallel with migration")
+    parser.add_argument("--islands", type=int, default=mp.cpu_count(), help="islands (processes) on this node")
+    parser.add_argument("--population", type=int, default=100, help="characters per island")
+    parser.add_argument("--generations", type=int, default=50)
+    parser.add_argument("--migration-interval", type=int, default=5, help="generations between two migrations")
+    parser.add_argument("--migrants", type=int, default=2, help="best genomes sent to the next island")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--listen", type=str, default=None,
+                        help="host:port to receive migrants from the previous node of the ring")
+    parser.add_argument("--next-node", type=str, default=None,
+                        help="host:port of the next node of the ring (the last island sends there)")
+    parser.add_argument("--authkey", type=str, default=None,
+                        help="shared secret of the nodes of the ring, required with --listen or --next-node")
+    args = parser.parse_args()
+    if (args.listen is not None or args.next_node is not None) and not args.authkey:
+        parser.error("--listen and --next-node need an --authkey")
+
+    settings = IslandSettings(args.population, args.generations, args.migration_interval, args.migrants)
+    # separate seeds per island, so the islands are reproducible but do not explore the same genomes
+    seeds = np.random.SeedSequence(args.seed).spawn(args.islands)
+    authkey = args.authkey.encode() if args.authkey else None
+
+    inboxes = [mp.Queue() for _ in range(args.islands)]
+    targets = [MigrationTarget(inboxes[i + 1]) for i in range(args.islands - 1)]
+    if args.next_node is not None:
+        targets.append(MigrationTarget(address=parse_address(args.next_node), authkey=authkey))
+    else:
+        targets.append(MigrationTarget(inboxes[0]))
+
+    listener = None
+    if args.listen is not None:
+        listener = Listener(parse_address(args.listen), authkey=authkey)
+        threading.Thread(target=forward_migrants, args=(listener, inboxes[0]), daemon=True).start()
+
+    results = mp.Queue()
+    processes = [mp.Process(target=run_island, args=(i, seeds[i], settings, inboxes[i], targets[i], results))
+                 for i in range(args.islands)]
+    for process in processes:
+        process.start()
+
+    out_dir = os.path.join('out', str(window_main.dir_count))
+    os.makedirs(out_dir)
+    done = 0
+    while done < args.islands:
+        message = results.get()
+        if message[0] == "generation":
+            _, index, gen_count, max_fitness, avg_fitness = message
+            print("Island: " + str(index) + " Gen: " + str(gen_count) + " Max Fitness: " + str(max_fitness) +
+                  " Avg Fitness: " + str(round(avg_fitness, 3)))
+        else:
+            _, index, blob = message
+            with open(os.path.join(out_dir, "island_" + str(index) + ".ckpt"), "wb") as file:
+                file.write(blob)
+            done += 1
+
+    # every island is done and nothing reads the inboxes anymore, drop the migrants that were never accepted
+    if listener is not None:
+        listener.close()
+    for inbox in inboxes:
+        inbox.cancel_join_thread()
+        while True:
+            try:
+                inbox.get_nowait()
+            except queue.Empty:
+                break
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 import pyray as rl
 import pymunk as pm
+import numpy as np
 import json
 import os
 
-from character_simulation import CharacterSimulation
-from next_gen import make_next_gen
+from character_simulation import CharacterSimulation, GROUND_POSITION, GROUND_POLY
+from next_gen import make_next_gen_batched
+from checkpoint import save_checkpoint, load_checkpoint
+from phase_timer import timer, configure_from_env
 
 dir_count = 0
 while True:
@@ -13,11 +16,15 @@ while True:
     dir_count += 1
 
 
-def output_data(gen_count: int, gen_list: list[CharacterSimulation]):
+# file_format is "json" (one list of dicts per generation) or "ckpt" (binary checkpoint, see checkpoint.py)
+def output_data(gen_count: int, gen_list: list[CharacterSimulation], file_format: str = "json"):
     if not os.path.exists('out'):
         os.mkdir('out')
     if not os.path.exists(os.path.join('out', str(dir_count))):
         os.mkdir(os.path.join('out', str(dir_count)))
+    if file_format == "ckpt":
+        save_checkpoint(os.path.join('out', str(dir_count), str(gen_count) + ".ckpt"), gen_list)
+        return
     data: list[dict] = []
     for sim in gen_list:
         data.append(sim.output_data())
@@ -26,28 +33,25 @@ def output_data(gen_count: int, gen_list: list[CharacterSimulation]):
 
 
 def main():
+    # QWOP_PROFILE=1 prints where the time goes, see phase_timer.py
+    configure_from_env()
     # rl.set_target_fps(60)
     camera = rl.Camera2D(rl.Vector2(1280 / 2, 720 / 2), rl.Vector2(0, 0), 0.0, 1.0)
     rl.set_config_flags(rl.ConfigFlags.FLAG_MSAA_4X_HINT)
     rl.init_window(1280, 720, "QWOP-BOT")
 
-    ground_position = 50, 150
-    ground_poly = [
-        (-50000, -25),
-        (-50000, 25),
-        (50000, 25),
-        (50000, -25),
-    ]
-
     ground_body: pm.Body = pm.Body(body_type=pm.Body.STATIC)
-    ground_body.position = ground_position
-    ground_shape = pm.Poly(ground_body, ground_poly)
+    ground_body.position = GROUND_POSITION
+    ground_shape = pm.Poly(ground_body, GROUND_POLY)
     ground_shape.friction = 0.8
     ground_shape.collision_type = pm.Body.STATIC
     ground_shape.collision_type = 2
 
+    # breeding is seeded from the OS, like the random networks of the first generation
+    rng = np.random.default_rng()
+
     # create 100 random characters for the 1st generation
-    sim_list: list[CharacterSimulation] = [CharacterSimulation(ground_position, ground_poly) for _ in range(100)]
+    sim_list: list[CharacterSimulation] = [CharacterSimulation(GROUND_POSITION, GROUND_POLY) for _ in range(100)]
 
     sim_time: float = 0.0
     app_time: float = 0.0
@@ -77,24 +81,26 @@ def main():
 
     while not rl.window_should_close():
         if rl.is_key_pressed(rl.KeyboardKey.KEY_S):
-            data = []
-            for sim in sim_list:
-                data.append(sim.output_data())
-            with open("network.json", "w") as file:
-                json.dump(data, file)
+            with timer.phase("persistence"):
+                # float64 weights, so loading it back with L gives exactly the same networks
+                save_checkpoint("network.ckpt", sim_list, np.float64)
 
         if rl.is_key_pressed(rl.KeyboardKey.KEY_L):
-            with open("network.json", "r") as file:
-                data = json.load(file)
             sim_list.clear()
-            sim_list = [CharacterSimulation(ground_position, ground_poly) for _ in range(len(data))]
+            # older saves are still loaded from network.json
+            if os.path.exists("network.ckpt"):
+                sim_list = load_checkpoint("network.ckpt", GROUND_POSITION, GROUND_POLY)
+            else:
+                with open("network.json", "r") as file:
+                    data = json.load(file)
+                sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY) for _ in range(len(data))]
+                for i, sim in enumerate(sim_list):
+                    sim.load_data(data[i])
             sim_time = 0.0
-            for i, sim in enumerate(sim_list):
-                sim.load_data(data[i])
 
         if rl.is_key_pressed(rl.KeyboardKey.KEY_R):
             sim_list.clear()
-            sim_list = [CharacterSimulation(ground_position, ground_poly) for _ in range(10)]
+            sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY) for _ in range(10)]
             sim_time = 0.0
 
         for sim in sim_list[
@@ -104,29 +110,31 @@ def main():
         app_time += time_step
         sub_sim_time += time_step
 
-        rl.begin_drawing()
-        rl.begin_mode_2d(camera)
+        with timer.phase("draw"):
+            rl.begin_drawing()
+            rl.begin_mode_2d(camera)
 
-        rl.clear_background(rl.BLACK)
+            rl.clear_background(rl.BLACK)
 
-        for sim in sim_list[
-                   start_subgen:end_subgen]:  # [start_subgen:end_subgen] so only work with 10 characters at a time
-            sim.draw_character()
+            for sim in sim_list[
+                       start_subgen:end_subgen]:  # [start_subgen:end_subgen] so only work with 10 characters at a time
+                sim.draw_character()
 
-        rl.draw_rectangle_pro(rl.Rectangle(round(ground_body.position.x), round(-ground_body.position.y), 50000, 50),
-                              rl.Vector2(50000 / 2, 50 / 2), 0.0, rl.GREEN)
+            rl.draw_rectangle_pro(rl.Rectangle(round(ground_body.position.x), round(-ground_body.position.y),
+                                               50000, 50),
+                                  rl.Vector2(50000 / 2, 50 / 2), 0.0, rl.GREEN)
 
-        # if rl.is_key_down(rl.KeyboardKey.KEY_Q):
-        #     sim.character_move_legs_q()
-        # elif rl.is_key_down(rl.KeyboardKey.KEY_W):
-        #     sim.character_move_legs_w()
-        #
-        # if rl.is_key_down(rl.KeyboardKey.KEY_O):
-        #     sim.character_move_knees_o()
-        # elif rl.is_key_down(rl.KeyboardKey.KEY_P):
-        #     sim.character_move_knees_p()
+            # if rl.is_key_down(rl.KeyboardKey.KEY_Q):
+            #     sim.character_move_legs_q()
+            # elif rl.is_key_down(rl.KeyboardKey.KEY_W):
+            #     sim.character_move_legs_w()
+            #
+            # if rl.is_key_down(rl.KeyboardKey.KEY_O):
+            #     sim.character_move_knees_o()
+            # elif rl.is_key_down(rl.KeyboardKey.KEY_P):
+            #     sim.character_move_knees_p()
 
-        rl.end_mode_2d()
+            rl.end_mode_2d()
 
         max_x = -float('inf')
         for sim in sim_list[
@@ -149,16 +157,19 @@ def main():
                 sim.fitness = round(sim.character_position().x, 0) / 1000.0
 
             # sort by the distance moved forward
-            generation_list: list[CharacterSimulation] = sorted(sim_list, key=lambda x: x.fitness)
+            with timer.phase("selection"):
+                generation_list: list[CharacterSimulation] = sorted(sim_list, key=lambda x: x.fitness)
 
-            output_data(gen_count, generation_list)
+            with timer.phase("persistence"):
+                output_data(gen_count, generation_list)
 
             half_index = len(generation_list) // 2
 
             # contains top 50% performers of this generation
             generation_list = generation_list[half_index:len(generation_list)]
 
-            children_list = make_next_gen(generation_list[0:len(generation_list)])
+            with timer.phase("breeding"):
+                children_list = make_next_gen_batched(generation_list, rng)
             top_5 = generation_list[len(generation_list)-5:len(generation_list)]
             children_list = children_list + top_5
 
@@ -185,17 +196,20 @@ def main():
                 last_max = 0
                 last_max_time = 0
 
-        rl.draw_text("Max Distance: " + str(round(max_x, 0) / 1000.0) + "m", 20, 0, 50,
-                     rl.Color(153, 204, 255, 255))
-        rl.draw_text("Sim Time: " + str(round(sim_time, 2)), 20, 50, 50, rl.Color(153, 204, 255, 255))
+        with timer.phase("draw"):
+            rl.draw_text("Max Distance: " + str(round(max_x, 0) / 1000.0) + "m", 20, 0, 50,
+                         rl.Color(153, 204, 255, 255))
+            rl.draw_text("Sim Time: " + str(round(sim_time, 2)), 20, 50, 50, rl.Color(153, 204, 255, 255))
+
+            rl.draw_text("Gen: " + str(gen_count), 20, 100, 50, rl.Color(153, 204, 255, 255))
 
-        rl.draw_text("Gen: " + str(gen_count), 20, 100, 50, rl.Color(153, 204, 255, 255))
+            rl.draw_text("SubGen: " + str(subgen_count), 20, 150, 50, rl.Color(153, 204, 255, 255))
 
-        rl.draw_text("SubGen: " + str(subgen_count), 20, 150, 50, rl.Color(153, 204, 255, 255))
+            rl.draw_text("SubGen Time: " + str(round(sub_sim_time, 2)), 20, 200, 50, rl.Color(153, 204, 255, 255))
 
-        rl.draw_text("SubGen Time: " + str(round(sub_sim_time, 2)), 20, 200, 50, rl.Color(153, 204, 255, 255))
+            rl.end_drawing()
 
-        rl.end_drawing()
+        timer.maybe_report()
     rl.close_window()
 
 
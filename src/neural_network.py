@@ -6,9 +6,12 @@ from util import sigmoid
 class NeuralNetwork:
 
     # TODO: Make the number of hidden layers variable
-    def __init__(self, input_nodes: int = 24, hidden_nodes: int = 12, output_nodes: int = 4):
-        self.bias_ih: float = np.random.randn()
-        self.bias_ho: float = np.random.randn()
+    # rng: generator for the initial weights, the global np.random state is used if None
+    def __init__(self, input_nodes: int = 24, hidden_nodes: int = 12, output_nodes: int = 4,
+                 rng: np.random.Generator | None = None):
+        random_state = rng if rng is not None else np.random
+        self.bias_ih: float = random_state.standard_normal()
+        self.bias_ho: float = random_state.standard_normal()
 
         # Initialize weights from input layer to hidden layer
         # [
@@ -16,7 +19,7 @@ class NeuralNetwork:
         #   [in1 -> h2, in2 -> h2, in3 -> h2, ...],
         #   ...
         # ]
-        self.weights_ih: np.ndarray = np.random.randn(hidden_nodes, input_nodes + 1)  # + 1 is for bias
+        self.weights_ih: np.ndarray = random_state.standard_normal((hidden_nodes, input_nodes + 1))  # + 1 is for bias
 
         # Initialize weights from hidden layer to output layer
         # [
@@ -24,7 +27,18 @@ class NeuralNetwork:
         #   [h1 -> out2, h2 -> out2, h3 -> out2, ...],
         #   ...
         # ]
-        self.weights_ho: np.ndarray = np.random.randn(output_nodes, hidden_nodes + 1)  # + 1 is for bias
+        self.weights_ho: np.ndarray = random_state.standard_normal((output_nodes, hidden_nodes + 1))  # + 1 is for bias
+
+    # Network with the given weights, without drawing random initial weights first (e.g. for children)
+    @classmethod
+    def from_weights(cls, weights_ih: np.ndarray, weights_ho: np.ndarray, bias_ih: float,
+                     bias_ho: float) -> "NeuralNetwork":
+        network = cls.__new__(cls)
+        network.weights_ih = weights_ih
+        network.weights_ho = weights_ho
+        network.bias_ih = bias_ih
+        network.bias_ho = bias_ho
+        return network
 
     def feedforward(self, inputs: np.ndarray) -> np.ndarray:
         # Calculate outputs for hidden layer, by using dot product
@@ -54,3 +68,30 @@ class NeuralNetwork:
             "weights_ho": self.weights_ho.tolist()
         }
         return data
+
+
+# Population level network engine. Stacks the weights of many NeuralNetworks that share the same layout
+# so the whole population is evaluated with one batched matmul per layer instead of one np.dot per neuron
+class PopulationNetwork:
+    def __init__(self, networks: list[NeuralNetwork]):
+        # (N, hidden_nodes, input_nodes + 1), float64 like NeuralNetwork even for float32 weights loaded from a
+        # checkpoint
+        self.weights_ih: np.ndarray = np.stack([network.weights_ih for network in networks]).astype(
+            np.float64, copy=False)
+        # (N, output_nodes, hidden_nodes + 1)
+        self.weights_ho: np.ndarray = np.stack([network.weights_ho for network in networks]).astype(
+            np.float64, copy=False)
+        # (N, 1) so they can be appended as the extra bias input of every row
+        self.bias_ih: np.ndarray = np.asarray([network.bias_ih for network in networks], dtype=np.float64)[:, None]
+        self.bias_ho: np.ndarray = np.asarray([network.bias_ho for network in networks], dtype=np.float64)[:, None]
+
+    def __len__(self) -> int:
+        return self.weights_ih.shape[0]
+
+    # inputs is (N, input_nodes) with one row per network, returns (N, output_nodes)
+    def feedforward(self, inputs: np.ndarray) -> np.ndarray:
+        inputs_with_bias = np.concatenate((inputs, self.bias_ih), axis=1)
+        hidden_outputs = sigmoid(np.matmul(self.weights_ih, inputs_with_bias[:, :, None])[:, :, 0])
+
+        hidden_with_bias = np.concatenate((hidden_outputs, self.bias_ho), axis=1)
+        return sigmoid(np.matmul(self.weights_ho, hidden_with_bias[:, :, None])[:, :, 0])
@@ -5,11 +5,13 @@ import colorsys
 import pyray as rl
 
 from neural_network import NeuralNetwork
-from character_simulation import CharacterSimulation
+from character_simulation import CharacterSimulation, GROUND_POSITION, GROUND_POLY
 
 
-# Make child network of two parents
-def make_next_gen_child_nn(nn_1: NeuralNetwork, nn_2: NeuralNetwork) -> NeuralNetwork:
+# Make child network of two parents. rng is a random.Random with the same interface as the random module,
+# the global random state is used if None
+def make_next_gen_child_nn(nn_1: NeuralNetwork, nn_2: NeuralNetwork, rng: random.Random | None = None) -> NeuralNetwork:
+    rng = rng if rng is not None else random
     child_weights_ih: np.ndarray = np.zeros(nn_1.weights_ih.shape)
     child_weights_ho: np.ndarray = np.zeros(nn_1.weights_ho.shape)
 
@@ -18,63 +20,121 @@ def make_next_gen_child_nn(nn_1: NeuralNetwork, nn_2: NeuralNetwork) -> NeuralNe
     # initialize child's ih weights
     for i in range(child_weights_ih.shape[0]):
         for j in range(child_weights_ih.shape[1]):
-            rand = random.random()
+            rand = rng.random()
             if rand < 0.5:
                 child_weights_ih[i][j] = nn_1.weights_ih[i][j]
             elif rand > mutation_probability:
                 child_weights_ih[i][j] = nn_2.weights_ih[i][j]
             else:
-                child_weights_ih[i][j] = random.gauss(0, 0.01)
+                child_weights_ih[i][j] = rng.gauss(0, 0.01)
 
     # initialize child's ho weights
     for i in range(child_weights_ho.shape[0]):
         for j in range(child_weights_ho.shape[1]):
-            rand = random.random()
+            rand = rng.random()
             if rand < 0.5:
                 child_weights_ho[i][j] = nn_1.weights_ho[i][j]
             elif rand > mutation_probability:
                 child_weights_ho[i][j] = nn_2.weights_ho[i][j]
             else:
-                child_weights_ho[i][j] = random.gauss(0, 0.01)
+                child_weights_ho[i][j] = rng.gauss(0, 0.01)
 
-    child_network: NeuralNetwork = NeuralNetwork()
-
-    child_network.weights_ih = child_weights_ih
-    child_network.weights_ho = child_weights_ho
-    child_network.bias_ih = nn_1.bias_ih if random.random() < 0.5 else nn_2.bias_ih
-    child_network.bias_ho = nn_1.bias_ho if random.random() < 0.5 else nn_2.bias_ho
-
-    return child_network
+    bias_ih = nn_1.bias_ih if rng.random() < 0.5 else nn_2.bias_ih
+    bias_ho = nn_1.bias_ho if rng.random() < 0.5 else nn_2.bias_ho
+    return NeuralNetwork.from_weights(child_weights_ih, child_weights_ho, bias_ih, bias_ho)
 
 
 # Make next 100 children (next generation)
-def make_next_gen(generation_list: list[CharacterSimulation]) -> list[CharacterSimulation]:
+def make_next_gen(generation_list: list[CharacterSimulation],
+                  rng: random.Random | None = None) -> list[CharacterSimulation]:
+    rng = rng if rng is not None else random
     children_list: list[CharacterSimulation] = []
 
     while len(children_list) < 95:
         # randomly select two parents
-        parent1, parent2 = random.sample(generation_list, 2)
+        parent1, parent2 = rng.sample(generation_list, 2)
 
         # make child network based on the selected parents
-        child_network: NeuralNetwork = make_next_gen_child_nn(parent1.neural_network, parent2.neural_network)
-
-        ground_position = 50, 150
-        ground_poly = [
-            (-50000, -25),
-            (-50000, 25),
-            (50000, 25),
-            (50000, -25),
-        ]
+        child_network: NeuralNetwork = make_next_gen_child_nn(parent1.neural_network, parent2.neural_network, rng)
 
         # make a character, add to children_list
-        child: CharacterSimulation = CharacterSimulation(ground_position, ground_poly)
-        child.neural_network = child_network
+        child: CharacterSimulation = CharacterSimulation(GROUND_POSITION, GROUND_POLY, neural_network=child_network,
+                                                         color=mix_color(parent1.color, parent2.color))
+        children_list.append(child)
+
+    return children_list
 
-        mixed_color = colorsys.rgb_to_hsv(int((parent1.color.r + parent2.color.r)/2),
-                                          int((parent1.color.g + parent2.color.g)/2),
-                                          int((parent1.color.b + parent2.color.b)/2))
 
-        child.color = rl.color_from_hsv(mixed_color[0], mixed_color[1], mixed_color[2])
+def mix_color(color_1: rl.Color, color_2: rl.Color) -> rl.Color:
+    mixed_color = colorsys.rgb_to_hsv(int((color_1.r + color_2.r)/2),
+                                      int((color_1.g + color_2.g)/2),
+                                      int((color_1.b + color_2.b)/2))
+
+    return rl.color_from_hsv(mixed_color[0], mixed_color[1], mixed_color[2])
+
+
+# Uniform crossover and Gaussian mutation for a whole batch of weight matrices at once.
+# Each weight comes from parent 1 with probability 0.5, from parent 2 with probability 0.5 - mutation_probability
+# and is replaced by gauss(0, mutation_sigma) otherwise
+def crossover_weights(weights_1: np.ndarray, weights_2: np.ndarray, rng: np.random.Generator,
+                      mutation_probability: float, mutation_sigma: float) -> np.ndarray:
+    rand = rng.random(weights_1.shape)
+    child_weights = np.where(rand < 0.5, weights_1, weights_2)
+    mutation_mask = rand >= 1.0 - mutation_probability
+    child_weights[mutation_mask] = rng.normal(0.0, mutation_sigma, np.count_nonzero(mutation_mask))
+    return child_weights
+
+
+# Vectorized make_next_gen_child_nn for a batch of parent pairs (parents_1[i] is bred with parents_2[i])
+def make_next_gen_child_nns(parents_1: list[NeuralNetwork], parents_2: list[NeuralNetwork], rng: np.random.Generator,
+                            mutation_probability: float = 0.05,
+                            mutation_sigma: float = 0.01) -> list[NeuralNetwork]:
+    child_weights_ih = crossover_weights(np.stack([nn.weights_ih for nn in parents_1]),
+                                         np.stack([nn.weights_ih for nn in parents_2]),
+                                         rng, mutation_probability, mutation_sigma)
+    child_weights_ho = crossover_weights(np.stack([nn.weights_ho for nn in parents_1]),
+                                         np.stack([nn.weights_ho for nn in parents_2]),
+                                         rng, mutation_probability, mutation_sigma)
+    bias_mask = rng.random((len(parents_1), 2)) < 0.5
+
+    return [NeuralNetwork.from_weights(child_weights_ih[i], child_weights_ho[i],
+                                      nn_1.bias_ih if bias_mask[i, 0] else nn_2.bias_ih,
+                                      nn_1.bias_ho if bias_mask[i, 1] else nn_2.bias_ho)
+            for i, (nn_1, nn_2) in enumerate(zip(parents_1, parents_2))]
+
+
+# Same as make_next_gen but parents are drawn from a seeded generator and all children are bred in one batch.
+# Sims from sim_pool (e.g. the ones that were not selected) are reset and reused for the children
+# instead of building new ones
+def make_next_gen_batched(generation_list: list[CharacterSimulation], rng: np.random.Generator,
+                          num_children: int = 95,
+                          sim_pool: list[CharacterSimulation] | None = None) -> list[CharacterSimulation]:
+    # two distinct parents per child, like random.sample(generation_list, 2)
+    first = rng.integers(0, len(generation_list), num_children)
+    second = rng.integers(0, len(generation_list) - 1, num_children)
+    second[second >= first] += 1
+
+    parents_1 = [generation_list[i] for i in first]
+    parents_2 = [generation_list[i] for i in second]
+    child_networks = make_next_gen_child_nns([sim.neural_network for sim in parents_1],
+                                             [sim.neural_network for sim in parents_2], rng)
+
+    # the pool may hold selected parents, so read everything needed from the parents before any sim is recycled
+    colors = [mix_color(parent1.color, parent2.color) for parent1, parent2 in zip(parents_1, parents_2)]
+    schedules = [parent1.schedule for parent1 in parents_1]
+    sim_pool = list(sim_pool) if sim_pool is not None else []
+
+    children_list: list[CharacterSimulation] = []
+    for child_network, color, schedule in zip(child_networks, colors, schedules):
+        if sim_pool:
+            child: CharacterSimulation = sim_pool.pop()
+            child.reset(schedule)
+            child.neural_network = child_network
+            child.color = color
+        else:
+            # nothing is drawn from rng here, so the children don't depend on how many sims were recycled
+            child: CharacterSimulation = CharacterSimulation(GROUND_POSITION, GROUND_POLY, schedule=schedule,
+                                                             neural_network=child_network, color=color)
         children_list.append(child)
 
     return children_list
@@ -0,0 +1,67 @@
+import math
+import multiprocessing as mp
+
+from character_simulation import CharacterSimulation
+from episode import evaluate
+from fitness_cache import FitnessCache
+from termination import TerminationPolicy
+from physics_schedule import PhysicsSchedule
+
+
+# Runs inside a worker process: rebuild the character locally, run a fixed length episode
+# and send back only the fitness. With a termination policy the episode ends as soon as the character is done
+def evaluate_genome(genome: dict, n_steps: int, time_step: float, policy: TerminationPolicy | None = None,
+                    schedule: PhysicsSchedule | None = None) -> float:
+    return evaluate(genome, 0, n_steps, time_step, policy, schedule).fitness
+
+
+def _evaluate_job(job: tuple[dict, int, float, TerminationPolicy | None, PhysicsSchedule | None]) -> float:
+    return evaluate_genome(*job)
+
+
+# Shards the genomes of a generation (NeuralNetwork.output_data() dicts) across a pool of worker processes.
+# Every CharacterSimulation owns its own pm.Space so the episodes are independent and scale with the core count.
+# Episodes are deterministic, so with a cache only genomes that were never seen with these settings are simulated
+class PopulationEvaluator:
+    def __init__(self, processes: int | None = None, n_steps: int = 360, time_step: float = 1.0 / 60.0,
+                 policy: TerminationPolicy | None = None, cache: FitnessCache | None = None,
+                 schedule: PhysicsSchedule | None = None):
+        self.processes: int = processes if processes else mp.cpu_count()
+        self.n_steps: int = n_steps
+        self.time_step: float = time_step
+        self.policy: TerminationPolicy | None = policy
+        self.cache: FitnessCache | None = cache
+        self.schedule: PhysicsSchedule = schedule if schedule is not None else PhysicsSchedule()
+        self.pool = mp.Pool(self.processes)
+
+    # Everything besides the genome that decides the fitness
+    @property
+    def config(self) -> tuple:
+        return "episode", self.n_steps, self.time_step, self.policy, self.schedule
+
+    def evaluate(self, genomes: list[dict]) -> list[float]:
+        # a few chunks per worker keeps the pool balanced without paying the IPC cost per genome
+        chunk_size = max(1, math.ceil(len(genomes) / (self.processes * 4)))
+        jobs = [(genome, self.n_steps, self.time_step, self.policy, self.schedule) for genome in genomes]
+        return self.pool.map(_evaluate_job, jobs, chunksize=chunk_size)
+
+    def evaluate_sims(self, sim_list: list[CharacterSimulation]) -> None:
+        if self.cache is not None:
+            self.cache.evaluate_sims(sim_list, self.config, self._simulate)
+        else:
+            self._simulate(sim_list)
+
+    def _simulate(self, sim_list: list[CharacterSimulation]) -> None:
+        fitness_list = self.evaluate([sim.neural_network.output_data() for sim in sim_list])
+        for sim, fitness in zip(sim_list, fitness_list):
+            sim.fitness = fitness
+
+    def close(self) -> None:
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
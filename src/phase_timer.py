@@ -0,0 +1,120 @@
+import atexit
+import json
+import os
+import time
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+# Returned by every phase() call while the timer is disabled, so a disabled timer costs one method call
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name: str):
+        self.timer = timer
+        self.name: str = name
+        self.start: int = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timer.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+# Cumulative time and call count per named phase of the training loop:
+#     with timer.phase("physics"):
+#         sim.space.step(time_step)
+# Phases can be nested, the time of a phase includes the phases inside it.
+# With trace_limit > 0 the first trace_limit phase calls are also kept as events for export_chrome_trace()
+class PhaseTimer:
+    def __init__(self):
+        self.enabled: bool = False
+        self.summary_interval: float | None = None
+        self.trace_limit: int = 0
+        self.reset()
+
+    def enable(self, summary_interval: float | None = None, trace_limit: int = 0) -> None:
+        self.enabled = True
+        self.summary_interval = summary_interval
+        self.trace_limit = trace_limit
+        self.reset()
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.totals: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+        # (name, start ns, end ns)
+        self.events: list[tuple[str, int, int]] = []
+        self.started: int = time.perf_counter_ns()
+        self.last_summary: int = self.started
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name: str, start: int, end: int) -> None:
+        self.totals[name] = self.totals.get(name, 0) + end - start
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if len(self.events) < self.trace_limit:
+            self.events.append((name, start, end))
+
+    def summary(self) -> str:
+        wall = max(time.perf_counter_ns() - self.started, 1)
+        lines = ["phase".ljust(20) + "calls".rjust(10) + "total s".rjust(10) + "mean us".rjust(10) +
+                 "% wall".rjust(8)]
+        for name in sorted(self.totals, key=self.totals.get, reverse=True):
+            total = self.totals[name]
+            lines.append(name.ljust(20) + str(self.counts[name]).rjust(10) + str(round(total / 1e9, 3)).rjust(10) +
+                         str(round(total / self.counts[name] / 1e3, 1)).rjust(10) +
+                         str(round(total / wall * 100, 1)).rjust(8))
+        return "\n".join(lines)
+
+    # Print the summary if summary_interval seconds passed since the last one, call it once per loop iteration
+    def maybe_report(self) -> None:
+        if not self.enabled or self.summary_interval is None:
+            return
+        now = time.perf_counter_ns()
+        if now - self.last_summary >= self.summary_interval * 1e9:
+            self.last_summary = now
+            print(self.summary())
+
+    # Write the recorded events as a Chrome trace (open in chrome://tracing or https://ui.perfetto.dev)
+    def export_chrome_trace(self, path: str) -> None:
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (start - self.started) / 1e3, "dur": (end - start) / 1e3,
+                   "pid": pid, "tid": 0} for name, start, end in self.events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+# Shared by the whole process so the simulation code can time its phases without passing a timer around
+timer = PhaseTimer()
+
+
+# Enable the shared timer from the environment, so the instrumentation can stay in place on training machines:
+# QWOP_PROFILE=1 turns it on, QWOP_PROFILE_INTERVAL sets the seconds between printed summaries (default 30)
+# and QWOP_PROFILE_TRACE=<path> keeps up to QWOP_PROFILE_TRACE_LIMIT events and writes them there on exit
+def configure_from_env() -> PhaseTimer:
+    if os.environ.get("QWOP_PROFILE", "0") in ("", "0"):
+        return timer
+    trace_path = os.environ.get("QWOP_PROFILE_TRACE")
+    timer.enable(float(os.environ.get("QWOP_PROFILE_INTERVAL", "30")),
+                 int(os.environ.get("QWOP_PROFILE_TRACE_LIMIT", "1000000")) if trace_path else 0)
+    if trace_path:
+        atexit.register(timer.export_chrome_trace, trace_path)
+    return timer
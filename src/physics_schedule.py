@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import numpy as np
+
+
+# How a simulation tick of time_step seconds is run:
+# - substeps: physics steps of time_step / substeps per tick
+# - control_interval: the network reads the character and sets new outputs every control_interval ticks,
+#   the muscles keep the last outputs in between
+# - iterations: solver iterations of the pm.Space (pymunk's default is 10)
+# The default is one physics step and one network decision per tick, which is how the sims always ran
+class PhysicsSchedule:
+    def __init__(self, substeps: int = 1, control_interval: int = 1, iterations: int = 10):
+        self.substeps: int = substeps
+        self.control_interval: int = control_interval
+        self.iterations: int = iterations
+
+    def is_control_tick(self, tick: int) -> bool:
+        return tick % self.control_interval == 0
+
+    # Part of the fitness cache key, so it has to list every setting
+    def __repr__(self) -> str:
+        return ("PhysicsSchedule(" + str(self.substeps) + ", " + str(self.control_interval) + ", " +
+                str(self.iterations) + ")")
+
+
+# Parse "time_step:substeps:control_interval:iterations", e.g. "30:1:1:10" for 30 Hz ticks
+def parse_setting(text: str) -> tuple[float, PhysicsSchedule]:
+    hz, substeps, control_interval, iterations = (int(value) for value in text.split(":"))
+    return 1.0 / hz, PhysicsSchedule(substeps, control_interval, iterations)
+
+
+# Drift report: run the same random genomes with every setting and compare the fitness against
+# the 60 Hz baseline (one physics step and one decision per tick, 10 iterations)
+def main():
+    # imported here so the schedule itself stays importable from character_simulation
+    from episode import evaluate
+    from termination import TerminationPolicy, UNSTABLE
+
+    parser = argparse.ArgumentParser(description="Compare physics schedules against the 60 Hz baseline")
+    parser.add_argument("--genomes", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=6.0, help="simulated time per episode")
+    parser.add_argument("settings", nargs="*",
+                        default=["60:1:2:10", "60:1:3:10", "60:1:1:5", "30:1:1:10", "30:2:1:5", "20:1:1:10"],
+                        help="tick rate in Hz:substeps:control interval:iterations")
+    args = parser.parse_args()
+
+    # only flag blow-ups, the episodes must run their full length
+    policy = TerminationPolicy(stop_on_fall=False, stagnation_seconds=None)
+
+    def run(time_step: float, schedule: PhysicsSchedule) -> tuple[np.ndarray, int, float]:
+        n_steps = round(args.seconds / time_step)
+        fitness = np.empty(args.genomes)
+        unstable = 0
+        start = time.perf_counter()
+        for seed in range(args.genomes):
+            result = evaluate(None, seed, n_steps, time_step, policy, schedule)
+            fitness[seed] = result.fitness
+            unstable += result.termination_reason == UNSTABLE
+        return fitness, unstable, (time.perf_counter() - start) / args.genomes
+
+    baseline, baseline_unstable, baseline_time = run(*parse_setting("60:1:1:10"))
+    print("setting       ms/episode  speedup  mean |drift|  max |drift|  correlation  unstable")
+    print("60:1:1:10".ljust(14) + str(round(baseline_time * 1000, 2)).ljust(12) + "1.0".ljust(9) +
+          "0.0".ljust(14) + "0.0".ljust(13) + "1.0".ljust(13) + str(baseline_unstable))
+    for setting in args.settings:
+        fitness, unstable, episode_time = run(*parse_setting(setting))
+        drift = np.abs(fitness - baseline)
+        print(setting.ljust(14) + str(round(episode_time * 1000, 2)).ljust(12) +
+              str(round(baseline_time / episode_time, 2)).ljust(9) + str(round(drift.mean(), 4)).ljust(14) +
+              str(round(drift.max(), 4)).ljust(13) + str(round(np.corrcoef(fitness, baseline)[0, 1], 4)).ljust(13) +
+              str(unstable))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import time
+
+import numpy as np
+import pymunk as pm
+import pyray as rl
+
+from character import Character, population_data_into, drive_character
+from character_simulation import CharacterSimulation, step_population, GROUND_POSITION, GROUND_POLY
+from neural_network import NeuralNetwork
+from inference import make_engine
+from physics_schedule import PhysicsSchedule
+from termination import TerminationPolicy, PopulationTermination
+from phase_timer import timer
+
+# Collision categories used in the shared space
+GROUND_CATEGORY = 0b01
+CHARACTER_CATEGORY = 0b10
+
+
+# One character of a PopulationSimulation. Has the character, fallen and character_position() of a
+# CharacterSimulation, so PopulationTermination and the trainer treat both the same way
+class SharedCharacter:
+    def __init__(self, character: Character, offset: float):
+        self.character: Character = character
+        # x the character was moved by in the shared space
+        self.offset: float = offset
+        # head or torso touched the ground, set by the begin callback for the whole episode
+        self.fallen: bool = False
+        self.collided: bool = False
+        # position when the character was frozen, see PopulationSimulation.step
+        self.frozen_position: "rl.Vector2 | None" = None
+
+    # Same as CharacterSimulation.character_position(), without the offset
+    def character_position(self) -> rl.Vector2:
+        if self.frozen_position is not None:
+            return self.frozen_position
+        return rl.Vector2(self.character.torso.body.position.x - self.offset,
+                          -self.character.torso.body.position.y + 100)
+
+
+# Population mode: N characters in one pm.Space with one shared ground and a single space.step per tick.
+# Every character gets its own ShapeFilter group (its limbs ignore each other, like group=1 in a private space)
+# and a mask that only contains the ground, so characters never interact. Fall detection, the physics schedule
+# and the network engine work like in CharacterSimulation / step_population, so with the default spacing=0 the
+# fitness is bit for bit the same as with one space per character.
+# spacing spreads the characters that many pixels apart along x. The filters alone already keep them apart, but
+# if they all overlap the broadphase still has to test every pair of limbs across the population. The offset is
+# removed from the network inputs and the fitness, but the rounding of x + offset makes long episodes drift
+# apart from the isolated run, like any other tiny perturbation would.
+class PopulationSimulation:
+    def __init__(self, ground_position: tuple[float, float], ground_poly: list[tuple[float, float]],
+                 networks: list[NeuralNetwork], spacing: float = 0.0, schedule: PhysicsSchedule | None = None,
+                 inference: str = "exact"):
+        self.space: pm.Space = pm.Space()
+        self.space.gravity = (0, -900.0)
+        self.schedule: PhysicsSchedule = schedule if schedule is not None else PhysicsSchedule()
+        self.space.iterations = self.schedule.iterations
+        # ticks since the start of the episode
+        self.ticks = 0
+
+        self.offsets: np.ndarray = (np.arange(len(networks)) - len(networks) // 2) * spacing
+
+        self.members: list[SharedCharacter] = []
+        for i in range(len(networks)):
+            first_body = len(self.space.bodies)
+            character = Character(self.space, leg_muscle_strength=1_000_000.0, arm_muscle_strength=50_000.0,
+                                  shape_filter=pm.ShapeFilter(group=i + 1, categories=CHARACTER_CATEGORY,
+                                                              mask=GROUND_CATEGORY))
+            for body in self.space.bodies[first_body:]:
+                body.position = (body.position.x + self.offsets[i], body.position.y)
+            self.members.append(SharedCharacter(character, float(self.offsets[i])))
+        self.characters: list[Character] = [member.character for member in self.members]
+
+        # stretch the ground so every character has the same amount of ground on both sides
+        shared_ground_poly = [(x + (self.offsets[0] if x < 0 else self.offsets[-1]), y) for x, y in ground_poly]
+
+        ground_body: pm.Body = pm.Body(body_type=pm.Body.STATIC)
+        ground_body.position = ground_position
+        ground_shape = pm.Poly(ground_body, shared_ground_poly)
+        ground_shape.friction = 0.8
+        ground_shape.collision_type = pm.Body.STATIC
+        ground_shape.filter = pm.ShapeFilter(categories=GROUND_CATEGORY)
+
+        self.space.add(ground_body, ground_shape)
+
+        self.network = make_engine(networks, inference)
+        self.inputs: np.ndarray = np.zeros((len(networks), len(self.characters[0].limb_bodies) * 2), dtype=np.float32)
+        self._read_inputs()
+        # characters that are still simulated, see step()
+        self.active: np.ndarray = np.ones(len(networks), dtype=np.bool_)
+
+        self.handler = self.space.add_collision_handler(1, 2)
+        self.handler.begin = self.fall_detection
+        self.handler.separate = self.collision_detection
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    # The character is found from the group of its shape filter
+    def collision_detection(self, arbiter, space, data):
+        for shape in arbiter.shapes:
+            if shape.filter.group > 0:
+                self.members[shape.filter.group - 1].collided = True
+
+    # Like CharacterSimulation.fall_detection: only the head or torso touching the ground counts as a fall
+    def fall_detection(self, arbiter, space, data) -> bool:
+        for shape in arbiter.shapes:
+            if shape.filter.group > 0:
+                member = self.members[shape.filter.group - 1]
+                if shape.body is member.character.torso.body or shape.body is member.character.head.body:
+                    member.fallen = True
+        return True
+
+    def _read_inputs(self) -> None:
+        population_data_into(self.characters, self.inputs)
+        self.inputs[:, 0::2] -= self.offsets[:, None]
+
+    # Advance one tick like step_population. Characters outside the active mask are frozen like isolated sims
+    # that are not stepped anymore: they get no outputs and character_position() keeps the position they had.
+    # Their bodies stay in the space, removing them changes the broadphase and with it the results of the other
+    # characters (a character that blew up does not, its NaNs don't reach the others)
+    def step(self, time_step: float, active: np.ndarray | None = None) -> None:
+        if active is not None:
+            for i in np.flatnonzero(self.active & ~active):
+                self.members[i].frozen_position = self.members[i].character_position()
+                self.active[i] = False
+
+        with timer.phase("physics"):
+            substeps = self.schedule.substeps
+            for _ in range(substeps):
+                self.space.step(time_step / substeps)
+            self.ticks += 1
+        if not self.schedule.is_control_tick(self.ticks):
+            return
+
+        with timer.phase("state"):
+            self._read_inputs()
+        with timer.phase("feedforward"):
+            outputs = self.network.feedforward(self.inputs)
+        with timer.phase("drive"):
+            for i in np.flatnonzero(self.active):
+                drive_character(self.characters[i], outputs[i])
+
+    # x position of every torso without the spacing offset, the value fitness is computed from
+    def positions_x(self) -> np.ndarray:
+        return np.asarray([character.torso.body.position.x for character in self.characters]) - self.offsets
+
+    # Fitness the way the trainer computes it for isolated sims: from PopulationTermination.final_x if a policy
+    # was used, otherwise from character_position()
+    def fitness(self, final_x: np.ndarray | None = None) -> np.ndarray:
+        if final_x is not None:
+            return np.round(final_x - self.offsets, 0) / 1000.0
+        return np.asarray([round(member.character_position().x, 0) / 1000.0 for member in self.members])
+
+
+# Benchmark the per-tick cost of one space per character against one shared space
+# and check both layouts end up with the same positions, falls and fitness
+def main():
+    parser = argparse.ArgumentParser(description="Compare isolated spaces with one shared population space")
+    parser.add_argument("--population", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--spacing", type=float, default=0.0,
+                        help="x distance between characters in the shared space (0 stacks them)")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="stop characters that fell, stopped moving forward or blew up in both layouts")
+    args = parser.parse_args()
+
+    time_step = 1.0 / 60.0
+    policy = TerminationPolicy() if args.early_stop else None
+
+    sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY) for _ in range(args.population)]
+    isolated_network = make_engine([sim.neural_network for sim in sim_list])
+    isolated_termination = PopulationTermination(policy, sim_list) if policy is not None else None
+    active = None
+    start = time.perf_counter()
+    for step in range(args.steps):
+        step_population(sim_list, isolated_network, time_step, active)
+        if isolated_termination is not None:
+            active = isolated_termination.update((step + 1) * time_step)
+    isolated_time = time.perf_counter() - start
+
+    population = PopulationSimulation(GROUND_POSITION, GROUND_POLY, [sim.neural_network for sim in sim_list],
+                                      args.spacing)
+    shared_termination = PopulationTermination(policy, population.members) if policy is not None else None
+    active = None
+    start = time.perf_counter()
+    for step in range(args.steps):
+        population.step(time_step, active)
+        if shared_termination is not None:
+            active = shared_termination.update((step + 1) * time_step)
+    shared_time = time.perf_counter() - start
+
+    if isolated_termination is not None:
+        isolated_fitness = np.round(isolated_termination.final_x, 0) / 1000.0
+        shared_fitness = population.fitness(shared_termination.final_x)
+    else:
+        isolated_fitness = np.asarray([round(sim.character_position().x, 0) / 1000.0 for sim in sim_list])
+        shared_fitness = population.fitness()
+    isolated_x = np.asarray([sim.character.torso.body.position.x for sim in sim_list])
+    fallen_mismatches = sum(sim.fallen != member.fallen for sim, member in zip(sim_list, population.members))
+
+    print("isolated spaces: " + str(round(isolated_time / args.steps * 1000, 3)) + " ms/tick")
+    print("shared space:    " + str(round(shared_time / args.steps * 1000, 3)) + " ms/tick")
+    print("max torso x difference: " + str(np.abs(isolated_x - population.positions_x()).max()))
+    print("fall mismatches: " + str(fallen_mismatches))
+    print("fitness mismatches: " + str(np.count_nonzero(isolated_fitness != shared_fitness)))
+
+
+if __name__ == "__main__":
+    main()
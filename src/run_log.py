@@ -0,0 +1,197 @@
+import os
+import struct
+
+import numpy as np
+
+from checkpoint import encode_checkpoint, decode_checkpoint
+
+# Append-only log of a whole GA run, one record per generation.
+# Record layout (every record starts 64-byte aligned): record header, float32 fitness of every individual,
+# then an optional genome payload (an encoded checkpoint, see checkpoint.py).
+# A side index file (<log>.idx) gets one fixed-size entry per record holding the record offset and the fitness
+# stats, so the summary of a run or a single generation can be read without parsing the records before it.
+# The index entry is only written after its record, so a crash never leaves the index pointing at a partial record.
+RECORD_MAGIC = b"QREC"
+_RECORD_HEADER = struct.Struct("<4sIIQ")  # magic, generation, individuals, payload length
+_ALIGNMENT = 64
+
+INDEX_DTYPE = np.dtype([
+    ("generation", "<u4"),
+    ("offset", "<u8"),
+    ("count", "<u4"),
+    ("min", "<f4"),
+    ("max", "<f4"),
+    ("mean", "<f4"),
+    ("std", "<f4"),
+])
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class RunRecord:
+    def __init__(self, generation: int, fitness: np.ndarray, payload: np.ndarray | None):
+        self.generation: int = generation
+        self.fitness: np.ndarray = fitness
+        self._payload = payload
+
+    # Decoded genome arrays (views into the log), or None if the record was written without genomes
+    @property
+    def genomes(self) -> dict[str, np.ndarray] | None:
+        if self._payload is None:
+            return None
+        return decode_checkpoint(self._payload)
+
+
+class RunLogWriter:
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path: str = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = RunLogReader(path)
+            if reader.rebuilt:
+                # appending to a log whose index was lost or is out of step with the records (a crash between a
+                # record and its index entry), recover it first so the index stays complete. A partial record
+                # at the end is cut off, the next record would be unreachable behind it
+                end = reader.indexed_end()
+                recovered_index = reader.index
+                del reader
+                with open(path + ".idx", "wb") as index:
+                    index.write(recovered_index.tobytes())
+                if end != os.path.getsize(path):
+                    os.truncate(path, end)
+        self._log = open(path, "ab")
+        self._index = open(path + ".idx", "ab")
+
+    def append(self, generation: int, fitness: np.ndarray, genomes: dict[str, np.ndarray] | None = None) -> None:
+        fitness = np.asarray(fitness, dtype=np.float32)
+        payload = encode_checkpoint(genomes) if genomes is not None else b""
+
+        offset = _align(self._log.tell())
+        record = bytearray(_align(_RECORD_HEADER.size + fitness.nbytes) + len(payload))
+        record[:_RECORD_HEADER.size] = _RECORD_HEADER.pack(RECORD_MAGIC, generation, fitness.shape[0], len(payload))
+        record[_RECORD_HEADER.size:_RECORD_HEADER.size + fitness.nbytes] = fitness.tobytes()
+        record[len(record) - len(payload):] = payload
+
+        self._log.write(bytes(offset - self._log.tell()))
+        self._log.write(record)
+        self._log.flush()
+
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry["generation"] = generation
+        entry["offset"] = offset
+        entry["count"] = fitness.shape[0]
+        if fitness.shape[0] > 0:
+            entry["min"] = fitness.min()
+            entry["max"] = fitness.max()
+            entry["mean"] = fitness.mean()
+            entry["std"] = fitness.std()
+        self._index.write(entry.tobytes())
+        self._index.flush()
+
+    def close(self) -> None:
+        self._log.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RunLogReader:
+    def __init__(self, path: str):
+        self.path: str = path
+        # the writer creates the log before the first generation, a run stopped before it leaves an empty file
+        # (and np.memmap can't map 0 bytes)
+        if os.path.getsize(path) == 0:
+            self._buffer = np.zeros(0, dtype=np.uint8)
+        else:
+            self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        self.index: np.ndarray = np.zeros(0, dtype=INDEX_DTYPE)
+        if len(self._buffer) > 0 and os.path.exists(path + ".idx"):
+            index = np.fromfile(path + ".idx", dtype=np.uint8)
+            # ignore a trailing partial entry from an interrupted write
+            index = index[:len(index) - len(index) % INDEX_DTYPE.itemsize]
+            self.index = index.view(INDEX_DTYPE)
+        # True if the side index was missing or does not end where the log ends, the records were walked instead
+        self.rebuilt: bool = self.indexed_end() != len(self._buffer)
+        if self.rebuilt:
+            self.index = self._rebuild_index()
+        self._positions: dict[int, int] = {int(generation): i for i, generation in
+                                           enumerate(self.index["generation"])}
+
+    # Walk the records to recover the index if the side file is missing
+    def _rebuild_index(self) -> np.ndarray:
+        entries: list[tuple] = []
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(self._buffer):
+            magic, generation, count, payload_length = _RECORD_HEADER.unpack(
+                self._buffer[offset:offset + _RECORD_HEADER.size].tobytes())
+            if magic != RECORD_MAGIC:
+                break
+            end = offset + _align(_RECORD_HEADER.size + count * 4) + payload_length
+            if end > len(self._buffer):
+                break
+            fitness = self._fitness_at(offset, count)
+            if count > 0:
+                entries.append((generation, offset, count, fitness.min(), fitness.max(), fitness.mean(),
+                                fitness.std()))
+            else:
+                entries.append((generation, offset, count, 0.0, 0.0, 0.0, 0.0))
+            offset = _align(end)
+        return np.asarray(entries, dtype=INDEX_DTYPE)
+
+    # Byte offset just past the last record in the index (-1 if the index points outside the log)
+    def indexed_end(self) -> int:
+        if len(self.index) == 0:
+            return 0
+        offset = int(self.index["offset"][-1])
+        if offset + _RECORD_HEADER.size > len(self._buffer):
+            return -1
+        magic, _, count, payload_length = _RECORD_HEADER.unpack(
+            self._buffer[offset:offset + _RECORD_HEADER.size].tobytes())
+        if magic != RECORD_MAGIC:
+            return -1
+        return offset + _align(_RECORD_HEADER.size + count * 4) + payload_length
+
+    def _fitness_at(self, offset: int, count: int) -> np.ndarray:
+        start = offset + _RECORD_HEADER.size
+        return self._buffer[start:start + count * 4].view(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def generations(self) -> np.ndarray:
+        return self.index["generation"]
+
+    # Per-generation fitness stats for the whole run, straight from the index
+    def summary(self) -> np.ndarray:
+        return self.index
+
+    def _record_at(self, position: int) -> RunRecord:
+        offset = int(self.index["offset"][position])
+        magic, generation, count, payload_length = _RECORD_HEADER.unpack(
+            self._buffer[offset:offset + _RECORD_HEADER.size].tobytes())
+        if magic != RECORD_MAGIC:
+            raise ValueError("corrupt run log record at offset " + str(offset))
+        payload = None
+        if payload_length > 0:
+            start = offset + _align(_RECORD_HEADER.size + count * 4)
+            payload = self._buffer[start:start + payload_length]
+        return RunRecord(generation, self._fitness_at(offset, count), payload)
+
+    # Seek straight to a generation
+    def read(self, generation: int) -> RunRecord:
+        if generation not in self._positions:
+            raise KeyError("generation " + str(generation) + " is not in " + self.path)
+        return self._record_at(self._positions[generation])
+
+    # Stream the records in the order they were written
+    def __iter__(self):
+        for position in range(len(self.index)):
+            yield self._record_at(position)
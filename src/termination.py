@@ -0,0 +1,77 @@
+import numpy as np
+
+from character_simulation import CharacterSimulation
+
+# Reasons an individual stopped
+RUNNING = 0
+FALLEN = 1
+STAGNANT = 2
+UNSTABLE = 3
+
+
+# When to stop simulating an individual:
+# - it fell (head or torso touched the ground)
+# - its torso did not get min_progress pixels further than its best x for stagnation_seconds
+# - its state is NaN/inf, a limb is further than max_position from the origin or the torso is faster than max_speed
+# Any of the checks can be turned off (stop_on_fall=False, stagnation_seconds=None)
+class TerminationPolicy:
+    def __init__(self, stop_on_fall: bool = True, stagnation_seconds: float | None = 3.0, min_progress: float = 1.0,
+                 max_position: float = 1_000_000.0, max_speed: float = 100_000.0):
+        self.stop_on_fall: bool = stop_on_fall
+        self.stagnation_seconds: float | None = stagnation_seconds
+        self.min_progress: float = min_progress
+        self.max_position: float = max_position
+        self.max_speed: float = max_speed
+
+    # Part of the fitness cache key, so it has to list every setting
+    def __repr__(self) -> str:
+        return ("TerminationPolicy(" + str(self.stop_on_fall) + ", " + str(self.stagnation_seconds) + ", " +
+                str(self.min_progress) + ", " + str(self.max_position) + ", " + str(self.max_speed) + ")")
+
+
+# Tracks the policy for a batch of sims. Once an individual is done it is frozen: the runner stops stepping it
+# and final_x keeps the torso x its fitness is computed from
+class PopulationTermination:
+    def __init__(self, policy: TerminationPolicy, sim_list: list[CharacterSimulation]):
+        self.policy: TerminationPolicy = policy
+        self.sim_list: list[CharacterSimulation] = sim_list
+        self.reasons: np.ndarray = np.full(len(sim_list), RUNNING, dtype=np.int8)
+        self.best_x: np.ndarray = np.asarray([sim.character.torso.body.position.x for sim in sim_list])
+        self.best_time: np.ndarray = np.zeros(len(sim_list))
+        self.final_x: np.ndarray = self.best_x.copy()
+
+    @property
+    def active(self) -> np.ndarray:
+        return self.reasons == RUNNING
+
+    def all_done(self) -> bool:
+        return not self.active.any()
+
+    # Check every running individual after a step, returns the mask of the ones that keep running
+    def update(self, sim_time: float) -> np.ndarray:
+        policy = self.policy
+        for i in np.flatnonzero(self.reasons == RUNNING):
+            sim = self.sim_list[i]
+            torso = sim.character.torso.body
+            x = torso.position.x
+
+            # the limb bodies themselves, sim.inputs is only refreshed on control ticks
+            positions = np.asarray([body.position for body in sim.character.limb_bodies])
+            if (not np.isfinite(positions).all() or np.abs(positions).max() > policy.max_position or
+                    not torso.velocity.length <= policy.max_speed):
+                # the current state is garbage, keep the best finite position instead
+                self.reasons[i] = UNSTABLE
+                self.final_x[i] = self.best_x[i]
+                continue
+
+            if x > self.best_x[i] + policy.min_progress:
+                self.best_x[i] = x
+                self.best_time[i] = sim_time
+
+            if policy.stop_on_fall and sim.fallen:
+                self.reasons[i] = FALLEN
+            elif policy.stagnation_seconds is not None and sim_time - self.best_time[i] >= policy.stagnation_seconds:
+                self.reasons[i] = STAGNANT
+            self.final_x[i] = x
+
+        return self.reasons == RUNNING
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the GA modules in src/ are imported as top level modules, the dql package from the repo root (like benchmarks/run.py)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,69 @@
+import numpy as np
+
+from character_simulation import CharacterSimulation, GROUND_POSITION, GROUND_POLY
+from checkpoint import (pack_population, encode_checkpoint, decode_checkpoint, save_checkpoint, read_checkpoint,
+                        load_checkpoint, load_population)
+
+
+def _population(count: int = 6) -> list[CharacterSimulation]:
+    rng = np.random.default_rng(0)
+    sim_list = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng) for _ in range(count)]
+    for sim in sim_list:
+        sim.fitness = float(rng.random())
+    return sim_list
+
+
+def _assert_same_networks(expected: list[CharacterSimulation], actual: list[CharacterSimulation]) -> None:
+    assert len(expected) == len(actual)
+    for a, b in zip(expected, actual):
+        assert np.array_equal(a.neural_network.weights_ih, b.neural_network.weights_ih)
+        assert np.array_equal(a.neural_network.weights_ho, b.neural_network.weights_ho)
+        assert a.neural_network.bias_ih == b.neural_network.bias_ih
+        assert a.neural_network.bias_ho == b.neural_network.bias_ho
+        assert (a.color.r, a.color.g, a.color.b, a.color.a) == (b.color.r, b.color.g, b.color.b, b.color.a)
+
+
+def test_float64_checkpoint_round_trips_exactly(tmp_path):
+    sim_list = _population()
+    path = str(tmp_path / "network.ckpt")
+    save_checkpoint(path, sim_list, np.float64)
+
+    loaded = load_checkpoint(path, GROUND_POSITION, GROUND_POLY)
+    _assert_same_networks(sim_list, loaded)
+    assert [np.float32(sim.fitness) for sim in sim_list] == [np.float32(sim.fitness) for sim in loaded]
+
+
+def test_float32_checkpoint_rounds_the_weights(tmp_path):
+    sim_list = _population()
+    path = str(tmp_path / "1.ckpt")
+    save_checkpoint(path, sim_list)
+
+    loaded = load_checkpoint(path, GROUND_POSITION, GROUND_POLY)
+    for sim, loaded_sim in zip(sim_list, loaded):
+        assert loaded_sim.neural_network.weights_ih.dtype == np.float32
+        assert np.array_equal(sim.neural_network.weights_ih.astype(np.float32), loaded_sim.neural_network.weights_ih)
+        assert np.allclose(sim.neural_network.weights_ho, loaded_sim.neural_network.weights_ho, atol=1e-6)
+
+
+def test_loaded_weights_are_views_into_the_file(tmp_path):
+    sim_list = _population()
+    path = str(tmp_path / "network.ckpt")
+    save_checkpoint(path, sim_list, np.float64)
+
+    arrays = read_checkpoint(path)
+    targets = [CharacterSimulation(GROUND_POSITION, GROUND_POLY, np.random.default_rng(1)) for _ in sim_list]
+    load_population(arrays, targets)
+    for i, sim in enumerate(targets):
+        assert np.shares_memory(sim.neural_network.weights_ih, arrays["weights_ih"])
+        assert not sim.neural_network.weights_ih.flags.writeable
+        assert np.array_equal(sim.neural_network.weights_ih, sim_list[i].neural_network.weights_ih)
+
+
+def test_encoded_arrays_decode_unchanged():
+    arrays = pack_population(_population(3), np.float64)
+    arrays["empty"] = np.zeros((0, 4), dtype=np.int16)
+    decoded = decode_checkpoint(np.frombuffer(encode_checkpoint(arrays), dtype=np.uint8))
+    assert list(decoded) == list(arrays)
+    for name, array in arrays.items():
+        assert decoded[name].dtype == array.dtype
+        assert np.array_equal(decoded[name], array)
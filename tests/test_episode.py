@@ -0,0 +1,62 @@
+import numpy as np
+
+from character_simulation import CharacterSimulation, GROUND_POSITION, GROUND_POLY
+from episode import evaluate, EpisodeResult
+from neural_network import NeuralNetwork
+from physics_schedule import PhysicsSchedule
+from termination import TerminationPolicy
+
+
+def _assert_same_result(a: EpisodeResult, b: EpisodeResult) -> None:
+    assert a.fitness == b.fitness
+    assert np.array_equal(a.trajectory, b.trajectory)
+    assert a.fallen == b.fallen
+    assert a.termination_reason == b.termination_reason
+
+
+def test_evaluate_is_deterministic_in_any_order():
+    genomes = [NeuralNetwork(rng=np.random.default_rng(i)).output_data() for i in range(3)]
+    cases = [
+        (genomes[0], 0, 120, None, None),
+        (None, 7, 120, None, None),
+        (genomes[1], 0, 150, TerminationPolicy(), None),
+        (genomes[2], 3, 90, None, PhysicsSchedule(2, 2, 12)),
+    ]
+    first = [evaluate(genome, seed, n_steps, 1.0 / 60.0, policy, schedule)
+             for genome, seed, n_steps, policy, schedule in cases]
+    # the same episodes again in reverse order, each one after a different previous episode
+    again = [evaluate(genome, seed, n_steps, 1.0 / 60.0, policy, schedule)
+             for genome, seed, n_steps, policy, schedule in reversed(cases)]
+    for a, b in zip(first, reversed(again)):
+        _assert_same_result(a, b)
+
+
+def test_evaluate_matches_a_new_simulation():
+    genome = NeuralNetwork(rng=np.random.default_rng(11)).output_data()
+    # an episode before, so evaluate runs on a reset simulation
+    evaluate(None, 1, 60)
+    result = evaluate(genome, 0, 120)
+
+    sim = CharacterSimulation(GROUND_POSITION, GROUND_POLY, np.random.default_rng(0))
+    sim.neural_network.load_data(genome)
+    trajectory = [sim.character.torso.body.position.x]
+    for _ in range(120):
+        sim.step(1.0 / 60.0)
+        trajectory.append(sim.character.torso.body.position.x)
+    assert np.array_equal(result.trajectory, np.asarray(trajectory))
+    assert result.fallen == sim.fallen
+
+
+def test_reset_matches_a_new_simulation():
+    rng = np.random.default_rng(5)
+    sim = CharacterSimulation(GROUND_POSITION, GROUND_POLY, rng)
+    fresh = CharacterSimulation(GROUND_POSITION, GROUND_POLY, neural_network=sim.neural_network, color=sim.color)
+    for _ in range(200):
+        sim.step(1.0 / 60.0)
+    sim.reset()
+    for _ in range(200):
+        sim.step(1.0 / 60.0)
+        fresh.step(1.0 / 60.0)
+    for body, fresh_body in zip(sim.character.limb_bodies, fresh.character.limb_bodies):
+        assert body.position == fresh_body.position
+        assert body.angle == fresh_body.angle
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from dql.replay_buffer import FrameReplayBuffer, PrioritizedReplayBuffer, SumTree
+
+
+# Store random episodes and check every sampled transition against a plain dict of what was stored at its slot
+@pytest.mark.parametrize("batched", [False, True])
+@pytest.mark.parametrize("max_size", [3, 7, 50])
+def test_frame_replay_buffer_matches_reference(batched, max_size):
+    rng = np.random.default_rng(0)
+    memory = FrameReplayBuffer(max_size, [3], rng=np.random.default_rng(1))
+    reference: dict[int, tuple] = {}
+    for _ in range(60):
+        length = int(rng.integers(1, 8))
+        frames = rng.standard_normal((length + 1, 3)).astype(np.float32)
+        actions = rng.integers(0, 4, length).astype(np.int32)
+        rewards = rng.random(length).astype(np.float32)
+        dones = np.zeros(length, dtype=np.bool_)
+        dones[-1] = rng.random() < 0.5
+        starts = np.zeros(length, dtype=np.bool_)
+        starts[0] = True
+        if batched:
+            indices = memory.store_transitions(frames[:-1], actions, rewards, frames[1:], dones, starts)
+            # a batch larger than the memory only stores its last rows
+            rows = range(length - len(indices), length)
+        else:
+            indices = [memory.store_transition(frames[i], actions[i], rewards[i], frames[i + 1], dones[i], starts[i])
+                       for i in range(length)]
+            rows = range(length)
+        for row, index in zip(rows, indices):
+            reference[int(index)] = (frames[row], actions[row], rewards[row], frames[row + 1], dones[row])
+
+        assert 0 < len(memory) <= max_size - 1
+        sampled, states, sampled_actions, sampled_rewards, new_states, terminals, weights = memory.sample(32)
+        for k, index in enumerate(sampled):
+            state, action, reward, new_state, done = reference[int(index)]
+            assert np.array_equal(states[k], state)
+            assert sampled_actions[k] == action
+            assert sampled_rewards[k] == reward
+            assert np.array_equal(new_states[k], new_state)
+            assert terminals[k] == done
+        assert np.all(weights == 1.0)
+
+
+def test_empty_frame_replay_buffer_refuses_to_sample():
+    with pytest.raises(ValueError):
+        FrameReplayBuffer(5, [2]).sample(2)
+
+
+def test_sum_tree_finds_the_prefix_sum_leaf():
+    rng = np.random.default_rng(0)
+    tree = SumTree(100)
+    priorities = rng.random(100)
+    tree.update(np.arange(100), priorities)
+    assert tree.total == pytest.approx(priorities.sum())
+
+    values = rng.random(1000) * tree.total
+    expected = np.searchsorted(np.cumsum(priorities), values, side="right")
+    assert np.array_equal(tree.find(values), expected)
+
+
+def test_sum_tree_updates_keep_the_sums():
+    rng = np.random.default_rng(1)
+    tree = SumTree(37)
+    priorities = np.zeros(37)
+    for _ in range(50):
+        indices = rng.integers(0, 37, 8)
+        values = rng.random(8)
+        tree.update(indices, values)
+        # the last write wins for repeated indices, like a fancy-index assignment
+        priorities[indices] = values
+        index = int(rng.integers(0, 37))
+        priority = float(rng.random())
+        tree.set(index, priority)
+        priorities[index] = priority
+
+        assert np.allclose(tree[np.arange(37)], priorities)
+        # every inner node is the sum of its children
+        inner = np.arange(1, tree.capacity)
+        assert np.allclose(tree.tree[inner], tree.tree[2 * inner] + tree.tree[2 * inner + 1])
+        assert tree.total == pytest.approx(priorities.sum())
+
+
+def test_prioritized_sampling_follows_the_priorities():
+    memory = PrioritizedReplayBuffer(64, [2], rng=np.random.default_rng(0), alpha=1.0, beta=1.0)
+    for i in range(64):
+        memory.store_transition(np.full(2, i), 0, 0.0, np.full(2, i + 1), False)
+    # transition 5 gets 63 times the priority of all the others together
+    td_errors = np.full(64, 1.0)
+    td_errors[5] = 63 * 63.0
+    memory.update_priorities(np.arange(64), td_errors - memory.epsilon)
+
+    counts = np.zeros(64, dtype=np.int64)
+    for _ in range(100):
+        indices, weights = memory.sample_indices(32)
+        np.add.at(counts, indices, 1)
+        assert weights.max() == pytest.approx(1.0)
+        # the rarely sampled transitions get the largest correction
+        if np.any(indices != 5):
+            assert np.all(weights[indices == 5] <= weights[indices != 5].min())
+    assert counts[5] / counts.sum() == pytest.approx(63 / 64, abs=0.02)
+    assert np.all(counts[np.arange(64) != 5] < counts[5] / 20)
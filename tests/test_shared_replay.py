@@ -0,0 +1,69 @@
+import numpy as np
+
+from dql.shared_replay import SharedReplayBuffer
+
+
+# Counters whose second read in sample() (the check after the batch was copied) first lets a writer store more
+# rows, like a writer running while the reader copies
+class _AdvancingCounters(np.ndarray):
+    def astype(self, *args, **kwargs):
+        self.reads += 1
+        if self.reads == 2:
+            self.advance()
+        return np.asarray(self).astype(*args, **kwargs)
+
+
+def _row(number: int, observation_size: int) -> tuple:
+    # every field of a row is derived from its write number, so a torn or overwritten row is easy to spot
+    return (np.full(observation_size, number, dtype=np.float32), number % 1000, float(number),
+            np.full(observation_size, number + 0.5, dtype=np.float32), number % 2 == 0)
+
+
+def test_sample_draws_rows_overwritten_during_the_copy_again(tmp_path):
+    store = SharedReplayBuffer.create(1, 32, 3, path=str(tmp_path / "replay.bin"), guard=4,
+                                      rng=np.random.default_rng(0))
+    writer = store.writer(0)
+    for number in range(100):
+        writer.store_transition(*_row(number, 3))
+
+    counters = store.counters.view(_AdvancingCounters)
+    counters.reads = 0
+
+    # a writer laps most of the ring between the copy and the check
+    def advance():
+        for _ in range(20):
+            writer.store_transition(*_row(writer.counter, 3))
+
+    counters.advance = advance
+    store.counters = counters
+
+    indices, states, actions, rewards, new_states, terminals, weights = store.sample(64)
+    assert counters.reads >= 3
+    # every returned row is the row that is in the memory now, none is a stale copy of an overwritten one
+    assert np.array_equal(states, store.state_memory[indices])
+    for k in range(64):
+        number = int(rewards[k])
+        state, action, reward, new_state, done = _row(number, 3)
+        assert np.array_equal(states[k], state)
+        assert actions[k] == action
+        assert np.array_equal(new_states[k], new_state)
+        assert terminals[k] == done
+        # and it was written before the batch was checked, outside the guard band of the writer
+        assert number < writer.counter
+        assert number >= writer.counter + store.guard - store.segment_capacity
+    store.close()
+
+
+def test_store_keeps_rows_after_reopening(tmp_path):
+    path = str(tmp_path / "replay.bin")
+    store = SharedReplayBuffer.create(2, 16, 3, path=path, guard=2)
+    writer = store.writer(1)
+    for number in range(5):
+        writer.store_transition(*_row(number, 3))
+    store.close()
+
+    reopened = SharedReplayBuffer.create(2, 16, 3, path=path, guard=2)
+    assert reopened.mem_cntr == 5
+    assert len(reopened) == 5
+    assert np.array_equal(reopened.reward_memory[16:21], np.arange(5, dtype=np.float32))
+    reopened.close()